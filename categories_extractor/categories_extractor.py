@@ -126,9 +126,9 @@ class CategoriesExtractor(ABC):
 
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if not self.output_path.exists():
+        if self.output_path.exists():
             with self.output_path.open("r") as file:
-                self.categories = list(set(self.categories + json.load(file)))
+                self.categories = sorted(set(self.categories + json.load(file)))
 
         with self.output_path.open("w") as f:
             json.dump(self.categories, f, indent=4)
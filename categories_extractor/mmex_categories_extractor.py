@@ -1,10 +1,10 @@
 import pathlib
-import sqlite3
 from typing import Self
 
 import pandas as pd
 
 from categories_extractor.categories_extractor import CategoriesExtractor
+from mmex.lookup_cache import cached_query
 
 
 class MMEXCategoriesExtractor(CategoriesExtractor):
@@ -13,11 +13,12 @@ class MMEXCategoriesExtractor(CategoriesExtractor):
     Attributes:
         path (pathlib.Path): The path to the input file or directory.
         output_path (pathlib.Path): The path to the output file or directory.
+        cache_dir (pathlib.Path | None): The directory of the lookup cache, None to always read the database.
         raw_categories (Iterator[T]): An iterator containing the raw categories to be parsed.
         categories (list[str]): a list containing the parsed categories
 
     Methods:
-        __init__(self, path: str | pathlib.Path, output_path: str | pathlib.Path) -> None:
+        __init__(self, path: str | pathlib.Path, output_path: str | pathlib.Path, cache_dir=None) -> None:
             Initialize a LedgerCategoriesCombination object with the provided path and output path.
 
         _parse_filepath(filepath: str | pathlib.Path) -> pathlib.Path:
@@ -30,12 +31,19 @@ class MMEXCategoriesExtractor(CategoriesExtractor):
             Extract categories from data and save them to the categories attribute.
     """
 
-    def __init__(self: Self, path: str | pathlib.Path, output_path: str | pathlib.Path) -> None:
+    def __init__(
+        self: Self,
+        path: str | pathlib.Path,
+        output_path: str | pathlib.Path,
+        cache_dir: str | pathlib.Path | None = None,
+    ) -> None:
         """Initialize a CategoriesExtractor object with the provided path and output path.
 
         Args:
             path (pathlib.Path | str): The path to the input file or directory.
             output_path (pathlib.Path | str): The path to the output file or directory.
+            cache_dir (pathlib.Path | str | None, optional): The directory of the lookup cache, None to always read the
+                database. Defaults to None.
 
         Raises:
             TypeError: If the path or output_path is not of type pathlib.Path or str.
@@ -49,23 +57,24 @@ class MMEXCategoriesExtractor(CategoriesExtractor):
             >>> CategoriesExtractor(path_, output_path_)
         """
         super().__init__(path=path, output_path=output_path)
+        self.cache_dir: pathlib.Path | None = None if cache_dir is None else pathlib.Path(cache_dir)
 
     def read_data(self: Self) -> None:
-        """Read categories from a MMEX SQLite database and return saves them to the raw_categories attribute."""
-        connection: sqlite3.Connection = sqlite3.connect(self.path)
-        cursor: sqlite3.Cursor = connection.cursor()
-        results: list = cursor.execute(
+        """Read categories from a MMEX SQLite database and return saves them to the raw_categories attribute.
+
+        When a cache directory is set, the table is served from the local lookup cache unless the database changed
+        since it was last read.
+        """
+        self.raw_categories: pd.DataFrame = cached_query(
+            self.path,
             """
             SELECT
                 *
             FROM
                 CATEGORY_V1
-            """
-        ).fetchall()
-
-        column_names: list[str] = [description[0] for description in cursor.description]
-        connection.close()
-        self.raw_categories: pd.DataFrame = pd.DataFrame(results, columns=column_names)
+            """,
+            self.cache_dir,
+        )
 
     def _find_all_combinations(
         self: Self,
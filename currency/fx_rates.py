@@ -0,0 +1,146 @@
+import pathlib
+from typing import Self
+
+import numpy as np
+import pandas as pd
+
+BASE_CURRENCY: str = "EUR"
+COMMODITY_CODES: dict[str, str] = {"€": "EUR", "$": "USD", "£": "GBP", "¥": "JPY"}
+
+
+def normalize_commodities(commodities: pd.Series) -> pd.Series:
+    """Convert the ledger commodities (symbols or codes) to ISO 4217 currency codes.
+
+    Args:
+        commodities (pd.Series): The ledger commodities.
+
+    Returns:
+        pd.Series: The currency codes, the commodities that are not known symbols are only stripped and uppercased.
+    """
+    unique_commodities: np.ndarray = commodities.dropna().unique()
+    codes: dict[str, str] = {
+        commodity: COMMODITY_CODES.get(commodity.strip(), commodity.strip().upper()) for commodity in unique_commodities
+    }
+    return commodities.map(codes).fillna(BASE_CURRENCY)
+
+
+class FxRates:
+    """FxRates holds the historical exchange rates of every currency towards the base currency.
+
+    The rates of every currency are kept as two arrays sorted by date, so that the rate in force on any date is found
+    with a binary search and whole columns of amounts can be converted at once.
+
+    Attributes:
+        base_currency (str): The currency in which all the rates are expressed.
+        dates (dict[str, np.ndarray]): A dictionary mapping each currency to the sorted dates of its rates.
+        rates (dict[str, np.ndarray]): A dictionary mapping each currency to the value of one unit in base currency.
+    """
+
+    def __init__(self: Self, rates: pd.DataFrame, base_currency: str = BASE_CURRENCY) -> None:
+        """Initialize a FxRates object from a DataFrame of rates.
+
+        Args:
+            rates (pd.DataFrame): A DataFrame with the DATE, CURRENCY and RATE columns, RATE being the value of one
+                unit of CURRENCY in base currency.
+            base_currency (str, optional): The currency in which the rates are expressed. Defaults to "EUR".
+
+        Returns:
+            None
+        """
+        self.base_currency: str = base_currency
+        self.dates: dict[str, np.ndarray] = {}
+        self.rates: dict[str, np.ndarray] = {}
+
+        rates = rates.assign(DATE=pd.to_datetime(rates.DATE))
+        for currency, currency_rates in rates.sort_values(["CURRENCY", "DATE"]).groupby("CURRENCY"):
+            self.dates[currency] = currency_rates.DATE.to_numpy().astype("datetime64[D]")
+            self.rates[currency] = currency_rates.RATE.to_numpy(dtype=float)
+
+    @classmethod
+    def from_csv(cls: type[Self], path: str | pathlib.Path | None, base_currency: str = BASE_CURRENCY) -> Self:
+        """Load the rates from a csv file with the DATE, CURRENCY and RATE columns.
+
+        Args:
+            path (str | pathlib.Path | None): The path to the csv file. If None or missing, no rates are loaded and
+                only amounts that are already in the target currency can be converted.
+            base_currency (str, optional): The currency in which the rates are expressed. Defaults to "EUR".
+
+        Returns:
+            FxRates: The loaded rates.
+        """
+        if path is None or not pathlib.Path(path).expanduser().exists():
+            return cls(pd.DataFrame(columns=["DATE", "CURRENCY", "RATE"]), base_currency)
+
+        return cls(pd.read_csv(pathlib.Path(path).expanduser()), base_currency)
+
+    def rates_at(self: Self, currency: str, dates: np.ndarray) -> np.ndarray:
+        """Find the rate of a currency in force on each of the given dates.
+
+        Args:
+            currency (str): The currency code.
+            dates (np.ndarray): The dates, as datetime64[D].
+
+        Returns:
+            np.ndarray: The value of one unit of currency in base currency, NaN where no rate is known.
+        """
+        if currency == self.base_currency:
+            return np.ones(len(dates))
+
+        if currency not in self.dates:
+            return np.full(len(dates), np.nan)
+
+        positions: np.ndarray = np.searchsorted(self.dates[currency], dates, side="right") - 1
+        rates: np.ndarray = self.rates[currency][np.clip(positions, 0, None)]
+        return np.where(positions >= 0, rates, np.nan)
+
+    def to_base(self: Self, currencies: pd.Series, dates: pd.Series) -> pd.Series:
+        """Compute the value in base currency of one unit of each currency on each date.
+
+        Args:
+            currencies (pd.Series): The currency codes.
+            dates (pd.Series): The dates, in any format understood by pandas.
+
+        Returns:
+            pd.Series: The rates, aligned with the input, NaN where no rate is known.
+        """
+        day_dates: np.ndarray = pd.to_datetime(dates).to_numpy().astype("datetime64[D]")
+        currency_values: np.ndarray = currencies.to_numpy()
+        rates: np.ndarray = np.full(len(currencies), np.nan)
+
+        for currency in pd.unique(currency_values):
+            mask: np.ndarray = currency_values == currency
+            rates[mask] = self.rates_at(currency, day_dates[mask])
+
+        return pd.Series(rates, index=currencies.index)
+
+    def convert(
+        self: Self, amounts: pd.Series, currencies: pd.Series, target_currencies: pd.Series, dates: pd.Series
+    ) -> pd.Series:
+        """Convert the amounts from their currency to the target currency at the rate of their date.
+
+        Args:
+            amounts (pd.Series): The amounts to convert.
+            currencies (pd.Series): The currency of every amount.
+            target_currencies (pd.Series): The currency every amount is converted to.
+            dates (pd.Series): The date of every amount.
+
+        Returns:
+            pd.Series: The converted amounts, NaN where a rate is missing.
+        """
+        same_currency: pd.Series = currencies == target_currencies
+        converted: pd.Series = amounts * self.to_base(currencies, dates) / self.to_base(target_currencies, dates)
+        return converted.where(~same_currency, amounts)
+
+    def history(self: Self) -> pd.DataFrame:
+        """Return all the rates as a DataFrame.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the CURRENCY, DATE (ISO format) and RATE columns.
+        """
+        return pd.DataFrame(
+            {
+                "CURRENCY": np.concatenate([[currency] * len(dates) for currency, dates in self.dates.items()] or [[]]),
+                "DATE": np.concatenate([dates.astype(str) for dates in self.dates.values()] or [[]]),
+                "RATE": np.concatenate(list(self.rates.values()) or [[]]),
+            }
+        )
@@ -9,23 +9,17 @@ import re
 
 import pandas as pd
 
-os.chdir(pathlib.Path.cwd().parents[0])
+from currency.fx_rates import FxRates, normalize_commodities
+from mmex.records import CONVERTED_COLUMNS
 
 LEDGER_PATH: str = "~/Nextcloud/Note/Finanze/ledger/{}.csv"
 OUTPUT_PATH: str = "data/{}.csv"
-OUTPUT_COLUMNS: list[str] = [
-    "Data",
-    "Stato",
-    "Tipo",
-    "Conto",
-    "ToConto",
-    "Beneficiario",
-    "Importo",
-    "Valuta",
-    "Categoria",
-    "Sotto-Categoria",
-    "Note",
-]
+OUTPUT_COLUMNS: list[str] = CONVERTED_COLUMNS
+SPLIT_COLUMNS: list[str] = ["Id", "Categoria", "Sotto-Categoria", "Importo"]
+TRANSACTION_TYPES: dict[str, str] = {"guadagni": "Deposit", "spese": "Withdrawal"}
+ZERO_TOLERANCE: float = 0.005
+PAYEE_SEPARATOR: str = "|"
+ACCOUNT_METADATA_COLUMNS: list[str] = ["TYPE", "NAME", "MAPPED_CATEGORY", "CATEGORY", "SUB_CATEGORY"]
 
 
 @dataclasses.dataclass
@@ -40,79 +34,56 @@ class LedgerCols:
     BOH3: str = "BOH3"
 
 
-def detect_transaction_type(accounts: list[str]) -> str:
-    for acc in [acc.split(":")[0].lower() for acc in accounts]:
-        if acc == "guadagni":
-            return "Deposit"
-        if acc == "spese":
-            return "Withdrawal"
-    return "Transfer"
-
-
-def extract_category(accounts: list[str], transaction_type: str) -> tuple[str, str]:
-    if transaction_type == "Transfer":
-        return "Trasferimento", "Trasferimento"
-
-    for account in accounts:
-        if "Assets" in account:
-            continue
-
-        splits: list[str] = mapped_categories[account].split(":")
-        if len(splits) == 1:
-            return splits[0], ""
-        return ":".join(splits[:-1]), splits[-1]
-    return "", ""
-
+def assign_transaction_ids(ledger: pd.DataFrame) -> pd.Series:
+    # A transaction starts when date or description change, or right after the postings seen so far balance to zero
+    new_entry: pd.Series = (ledger[LedgerCols.DATE] != ledger[LedgerCols.DATE].shift()) | (
+        ledger[LedgerCols.DESCRIPTION] != ledger[LedgerCols.DESCRIPTION].shift()
+    )
+    running_total: pd.Series = ledger[LedgerCols.AMOUNT].groupby(new_entry.cumsum()).cumsum()
+    balanced: pd.Series = (running_total.abs() < ZERO_TOLERANCE).shift(fill_value=False)
+    return (new_entry | balanced).cumsum() - 1
 
-def extract_transaction_accounts_payee(transaction: pd.DataFrame) -> tuple[str, None, None]:
-    from_account, to_account, payee = None, None, None
 
-    for _, row in transaction.iterrows():
-        if "Assets" in row[LedgerCols.CATEGORY] and not from_account:
-            from_account = row[LedgerCols.CATEGORY].split(":")[-1]
-    return from_account, to_account, payee
+def detect_account_type(account: str) -> str:
+    account_type: str | None = TRANSACTION_TYPES.get(account.split(":")[0].lower())
+    if account_type:
+        return account_type
+    return "Asset" if "Assets" in account else "Transfer"
 
 
-def extract_transfer_transaction_account_payee(transaction: pd.DataFrame) -> tuple[str, str, None]:
-    from_account, to_account, payee = None, None, None
+def extract_category(mapped_category: str | None) -> tuple[str | None, str | None]:
+    if mapped_category is None:
+        return None, None
 
-    for _, row in transaction.iterrows():
-        if row[LedgerCols.AMOUNT] < 0 and not from_account:
-            from_account = row[LedgerCols.CATEGORY].split(":")[-1]
-        if row[LedgerCols.AMOUNT] > 0 and not to_account:
-            to_account = row[LedgerCols.CATEGORY].split(":")[-1]
+    splits: list[str] = mapped_category.split(":")
+    if len(splits) == 1:
+        return splits[0], ""
+    return ":".join(splits[:-1]), splits[-1]
 
-    return from_account, to_account, payee
 
+def extract_payee(description: str) -> str | None:
+    # Descriptions are written as "Payee | note", a description without the separator is only a note
+    if PAYEE_SEPARATOR not in description:
+        return None
+    return " ".join(description.split(PAYEE_SEPARATOR)[0].split()) or None
 
-def process_transaction(dataframe: pd.DataFrame):
-    date: str = dataframe[LedgerCols.DATE][0].replace("/", "-")
-    transaction_type: str = detect_transaction_type(dataframe[LedgerCols.CATEGORY].tolist())
-    currency: str = "EUR"  # dataframe[LedgerCols.CURRENCY][0]
-    category, sub_category = extract_category(dataframe[LedgerCols.CATEGORY].tolist(), transaction_type)
-    amount: float = dataframe["AMOUNT_NORM"][0]
-    note: str = dataframe[LedgerCols.DESCRIPTION][0]
 
-    if transaction_type == "Transfer":
-        from_account, to_account, payee = extract_transfer_transaction_account_payee(
-            dataframe[[LedgerCols.CATEGORY, LedgerCols.AMOUNT]]
+def build_account_metadata(accounts: pd.Index, mapped_categories: dict[str, str]) -> pd.DataFrame:
+    # Built once per run over the distinct accounts, the postings then only index it with their account code
+    rows: list[tuple[str, str, str | None, str | None, str | None]] = []
+    for account in accounts:
+        leaf: str = account.split(":")[-1]
+        mapped_category: str | None = mapped_categories.get(account)
+        rows.append(
+            (
+                detect_account_type(account),
+                convert_conto_name(conto_map.get(leaf, leaf)),
+                mapped_category,
+                *extract_category(mapped_category),
+            )
         )
-    else:
-        from_account, to_account, payee = extract_transaction_accounts_payee(dataframe[[LedgerCols.CATEGORY]])
-
-    return [
-        date,
-        "R",
-        transaction_type,
-        conto_map.get(from_account, from_account),
-        conto_map.get(to_account, to_account),
-        payee,
-        amount,
-        currency,
-        category,
-        sub_category,
-        note,
-    ]
+
+    return pd.DataFrame(rows, index=accounts, columns=ACCOUNT_METADATA_COLUMNS)
 
 
 def convert_conto_name(old_conto: str | None) -> str | None:
@@ -126,30 +97,190 @@ def convert_conto_name(old_conto: str | None) -> str | None:
     return old_conto
 
 
-with pathlib.Path("/data/mapped_categories.json").open("r") as f:
-    mapped_categories: dict[str, str] = json.load(f)
-
 conto_map: dict[str, str] = {"Intesa XME": "Intesa", "Contanti Sant'Arcangelo": "Casa"}
 
-for year in (2021, 2022, 2023):
+
+def load_mapped_categories(path: str | pathlib.Path) -> dict[str, str]:
+    with pathlib.Path(path).expanduser().open("r") as f:
+        return json.load(f)
+
+
+def load_ledger(path: str | pathlib.Path, keep_starting_balances: bool = False) -> pd.DataFrame:
     ledger = pd.read_csv(
-        LEDGER_PATH.format(year), header=None, names=[x.name for x in dataclasses.fields(LedgerCols())]
+        pathlib.Path(path).expanduser(), header=None, names=[x.name for x in dataclasses.fields(LedgerCols())]
     ).drop(columns=[LedgerCols.BOH3, LedgerCols.BOH2, LedgerCols.BOH])
     ledger["AMOUNT_NORM"] = abs(ledger["AMOUNT"])
-    ledger = ledger[ledger["DESCRIPTION"] != "Starting balances"]
-    ledger = ledger.reset_index(drop=True)
+    if not keep_starting_balances:
+        ledger = ledger[ledger["DESCRIPTION"] != "Starting balances"]
+    return ledger.reset_index(drop=True)
+
+
+def convert_ledger(
+    ledger: pd.DataFrame, mapped_categories: dict[str, str], fx_rates: FxRates | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    fx_rates = fx_rates if fx_rates is not None else FxRates.from_csv(None)
+    ledger = ledger.sort_values(by=LedgerCols.DATE, kind="stable", ignore_index=True)
+    transaction_ids: pd.Series = assign_transaction_ids(ledger)
+    ledger = ledger[transaction_ids.groupby(transaction_ids).transform("size") > 1]
+    transaction_ids = transaction_ids[ledger.index]
+
+    account_codes, accounts = pd.factorize(ledger[LedgerCols.CATEGORY])
+    metadata: pd.DataFrame = build_account_metadata(accounts, mapped_categories)
+
+    def lookup(column: str) -> pd.Series:
+        return pd.Series(metadata[column].to_numpy()[account_codes], index=ledger.index)
+
+    currencies: pd.Series = normalize_commodities(ledger[LedgerCols.CURRENCY])
+    account_types: pd.Series = lookup("TYPE")
+    names: pd.Series = lookup("NAME")
+    is_asset: pd.Series = account_types == "Asset"
 
-    indexes: list[list[int]] = list(
-        ledger.sort_values(by="DATE").groupby(["DATE", "DESCRIPTION", "AMOUNT_NORM"]).groups.values()
+    transaction_types: pd.Series = (
+        account_types.where(account_types.isin(TRANSACTION_TYPES.values())).groupby(transaction_ids).first()
+    )
+    transaction_types = transaction_types.reindex(transaction_ids.unique()).fillna("Transfer")
+    posting_types: pd.Series = transaction_ids.map(transaction_types)
+    is_transfer: pd.Series = transaction_types == "Transfer"
+
+    # A MMEX transaction moves money on one account (two for a transfer), the transactions with more Assets postings
+    # cannot be represented: they are set aside with their reason and the rest of the ledger is converted
+    asset_counts: pd.Series = is_asset.groupby(transaction_ids).sum().reindex(transaction_types.index)
+    posting_counts: pd.Series = transaction_ids.groupby(transaction_ids).size().reindex(transaction_types.index)
+    reasons: pd.Series = pd.Series(None, index=transaction_types.index, dtype=object)
+    reasons[~is_transfer & (asset_counts != 1)] = "paid from or to more than one account"
+    reasons[is_transfer & (posting_counts != 2)] = "transfer with more than two postings"
+    unsupported_postings: pd.DataFrame = ledger.assign(REASON=transaction_ids.map(reasons)).dropna(subset="REASON")
+    if not unsupported_postings.empty:
+        kept: pd.Series = ~ledger.index.isin(unsupported_postings.index)
+        ledger, transaction_ids, account_codes = ledger[kept], transaction_ids[kept], account_codes[kept]
+        currencies, account_types, names, is_asset = currencies[kept], account_types[kept], names[kept], is_asset[kept]
+        posting_types = posting_types[kept]
+        transaction_types, is_transfer = transaction_types[reasons.isna()], is_transfer[reasons.isna()]
+
+    # A transaction is registered in the currency of its account, with the amount its Assets posting actually moved
+    outgoing: pd.Series = ledger[LedgerCols.AMOUNT] < 0
+    transaction_currencies: pd.Series = currencies.where(is_asset).groupby(transaction_ids).first()
+    transaction_currencies = transaction_currencies.reindex(transaction_types.index)
+    transaction_currencies[is_transfer] = currencies.where(outgoing).groupby(transaction_ids).first()
+    transaction_currencies = transaction_currencies.fillna(currencies.groupby(transaction_ids).first())
+    amounts: pd.Series = fx_rates.convert(
+        ledger[LedgerCols.AMOUNT], currencies, transaction_ids.map(transaction_currencies), ledger[LedgerCols.DATE]
     )
 
-    processed_transactions: list[list[str | float | None]] = [
-        process_transaction(ledger.loc[idx].reset_index(drop=True)) for idx in indexes if len(idx) == 2
-    ]
+    # Every non Assets posting of a Deposit or Withdrawal is a category posting, more than one make a split
+    is_category: pd.Series = ~is_asset & (posting_types != "Transfer")
+    category_ids: pd.Series = transaction_ids[is_category]
+    unmapped: pd.Series = is_category & lookup("MAPPED_CATEGORY").isna()
+    if unmapped.any():
+        raise KeyError(f"Unmapped ledger categories: {sorted(ledger[LedgerCols.CATEGORY][unmapped].unique())}")
+    # The category postings are scaled to the Assets amount, their own amounts only weigh them against each other:
+    # the rates are needed only to weigh category postings in different currencies
+    mixed_currencies: pd.Series = category_ids.map(currencies[is_category].groupby(category_ids).nunique() > 1)
+    weights: pd.Series = ledger[LedgerCols.AMOUNT][is_category].where(~mixed_currencies, amounts[is_category])
+    unconverted: pd.Series = weights.isna()
+    if unconverted.any():
+        missing: pd.DataFrame = ledger.loc[unconverted[unconverted].index, [LedgerCols.CURRENCY, LedgerCols.DATE]]
+        raise ValueError(f"Missing exchange rates for: {missing.drop_duplicates().to_numpy().tolist()}")
+    asset_amounts: pd.Series = ledger[LedgerCols.AMOUNT].where(is_asset).groupby(transaction_ids).first()
+    weight_totals: pd.Series = weights.groupby(category_ids).sum()
+    scales: pd.Series = (-asset_amounts.reindex(weight_totals.index) / weight_totals).where(weight_totals != 0, 1.0)
+    categories: pd.Series = lookup("CATEGORY")[is_category]
+    sub_categories: pd.Series = lookup("SUB_CATEGORY")[is_category]
+    split_amounts: pd.Series = weights * category_ids.map(scales) * posting_types[is_category].map(
+        {"Withdrawal": 1.0, "Deposit": -1.0}
+    )
+    is_split: pd.Series = category_ids.groupby(category_ids).size().reindex(transaction_types.index).fillna(0) > 1
+
+    from_accounts: pd.Series = names.where(is_asset).groupby(transaction_ids).first()
+    from_accounts[is_transfer] = names.where(outgoing).groupby(transaction_ids).first()
+    to_accounts: pd.Series = names.where(~outgoing).groupby(transaction_ids).first().where(is_transfer)
+    transaction_amounts: pd.Series = asset_amounts.abs().reindex(transaction_types.index)
+    transaction_amounts[is_transfer] = ledger[LedgerCols.AMOUNT].abs().where(outgoing).groupby(transaction_ids).first()
+    # The incoming posting of a transfer keeps its own amount and commodity, the rates are only a fallback for MMEX
+    to_amounts: pd.Series = ledger[LedgerCols.AMOUNT].where(~outgoing).groupby(transaction_ids).first()
+    to_amounts = to_amounts.where(is_transfer)
+    to_currencies: pd.Series = currencies.where(~outgoing).groupby(transaction_ids).first().where(is_transfer)
+
+    first_postings: pd.DataFrame = ledger.groupby(transaction_ids).first()
+    dates: pd.Series = first_postings[LedgerCols.DATE].str.replace("/", "-")
+    descriptions: pd.Series = first_postings[LedgerCols.DESCRIPTION]
+    notes: dict[str, str] = {description: convert_conto_name(description) for description in descriptions.unique()}
+    payees: dict[str, str | None] = {description: extract_payee(description) for description in descriptions.unique()}
+    processed_dataframe: pd.DataFrame = pd.DataFrame(
+        {
+            "Id": transaction_types.index,
+            "Data": dates,
+            "Stato": "R",
+            "Tipo": transaction_types,
+            "Conto": from_accounts,
+            "ToConto": to_accounts,
+            "Beneficiario": descriptions.map(payees).where(~is_transfer),
+            "Importo": transaction_amounts,
+            "Valuta": transaction_currencies,
+            "ImportoA": to_amounts,
+            "ValutaA": to_currencies,
+            "Categoria": categories.groupby(category_ids).first().where(~is_split, ""),
+            "Sotto-Categoria": sub_categories.groupby(category_ids).first().where(~is_split, ""),
+            "Note": descriptions.map(notes),
+        },
+        columns=OUTPUT_COLUMNS,
+    ).reset_index(drop=True)
+    processed_dataframe.loc[is_transfer.to_numpy(), ["Categoria", "Sotto-Categoria"]] = "Trasferimento"
+
+    in_split: pd.Series = category_ids.map(is_split)
+    splits_dataframe: pd.DataFrame = pd.DataFrame(
+        {
+            "Id": category_ids[in_split],
+            "Categoria": categories[in_split],
+            "Sotto-Categoria": sub_categories[in_split],
+            "Importo": split_amounts[in_split],
+        },
+        columns=SPLIT_COLUMNS,
+    ).reset_index(drop=True)
+
+    return processed_dataframe, splits_dataframe, unsupported_postings.reset_index(drop=True)
+
+
+def splits_path(output_path: str | pathlib.Path) -> pathlib.Path:
+    output_path = pathlib.Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_splits{output_path.suffix}")
+
+
+def unsupported_path(output_path: str | pathlib.Path) -> pathlib.Path:
+    output_path = pathlib.Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_unsupported{output_path.suffix}")
+
+
+def save_unsupported_postings(unsupported_postings: pd.DataFrame, output_path: str | pathlib.Path) -> None:
+    # The file only exists while there is something to fix in the ledger
+    path: pathlib.Path = unsupported_path(output_path)
+    if unsupported_postings.empty:
+        path.unlink(missing_ok=True)
+        return
+
+    unsupported_postings.to_csv(path, index=False)
+    print(f"{len(unsupported_postings)} ledger postings not converted, see {path}")
+
+
+def convert_ledger_file(
+    ledger_path: str | pathlib.Path,
+    output_path: str | pathlib.Path,
+    mapped_categories_path: str | pathlib.Path,
+    fx_rates_path: str | pathlib.Path | None = None,
+) -> None:
+    processed_dataframe, splits_dataframe, unsupported_postings = convert_ledger(
+        load_ledger(ledger_path), load_mapped_categories(mapped_categories_path), FxRates.from_csv(fx_rates_path)
+    )
+    pathlib.Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    processed_dataframe.to_csv(output_path, index=False)
+    splits_dataframe.to_csv(splits_path(output_path), index=False)
+    save_unsupported_postings(unsupported_postings, output_path)
 
-    processed_dataframe: pd.DataFrame = pd.DataFrame(processed_transactions, columns=OUTPUT_COLUMNS)
-    processed_dataframe["Beneficiario"] = processed_dataframe["Beneficiario"].apply(convert_conto_name)
-    processed_dataframe["Conto"] = processed_dataframe["Conto"].apply(convert_conto_name)
-    processed_dataframe["Note"] = processed_dataframe["Note"].apply(convert_conto_name)
 
-    processed_dataframe.to_csv(OUTPUT_PATH.format(year), index=False)
+if __name__ == "__main__":
+    os.chdir(pathlib.Path(__file__).parent)
+
+    for year in (2021, 2022, 2023):
+        convert_ledger_file(
+            LEDGER_PATH.format(year), OUTPUT_PATH.format(year), "data/mapped_categories.json", "data/fx_rates.csv"
+        )
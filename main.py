@@ -1,10 +1,22 @@
+import argparse
 import pathlib
+from functools import partial
+from typing import Any
 
 from categories_extractor.ledger_categories_extractor import LedgerCategoriesExtractor
 from categories_extractor.mmex_categories_extractor import MMEXCategoriesExtractor
+from data_preprocessing import convert_ledger_file, splits_path
+from notebooks.transfer_import import import_converted_files
+from pipeline.pipeline import Pipeline, Stage, StageCache
+from reconciliation.reconciliation import reconcile
 
+DEFAULT_LEDGER_DIR: str = "~/Nextcloud/Note/Finanze/ledger"
+DEFAULT_MMEX_PATH: str = "/home/paolo/Nextcloud/MoneyManager/finances.mmb"
+DEFAULT_MODEL_NAME: str = "distiluse-base-multilingual-cased-v1"
+DEFAULT_YEARS: list[int] = [2021, 2022, 2023]
 
-def extract_ledger_categories(input_path: str, output_path: pathlib.Path) -> None:
+
+def extract_ledger_categories(input_path: str | pathlib.Path, output_path: pathlib.Path) -> None:
     """Extract ledger categories from the input file and save them to the output file.
 
     Args:
@@ -25,12 +37,16 @@ def extract_ledger_categories(input_path: str, output_path: pathlib.Path) -> Non
     ledger_categories_extractor.execute()
 
 
-def extract_mmex_categories(input_path: str, output_path: pathlib.Path) -> None:
+def extract_mmex_categories(
+    input_path: str | pathlib.Path, output_path: pathlib.Path, cache_dir: pathlib.Path | None = None
+) -> None:
     """Extract MMEX categories from the input file and save them to the output file.
 
     Args:
         input_path (str): The path to the input file.
         output_path (pathlib.Path): The path to the output file.
+        cache_dir (pathlib.Path | None, optional): The directory of the lookup cache, None to always read the
+            database. Defaults to None.
 
     Returns:
         None
@@ -40,21 +56,210 @@ def extract_mmex_categories(input_path: str, output_path: pathlib.Path) -> None:
         # The MMEX categories are extracted from the input file and saved to the output file.
     """
     mmex_categories_extractor: MMEXCategoriesExtractor = MMEXCategoriesExtractor(
-        path=input_path, output_path=output_path
+        path=input_path, output_path=output_path, cache_dir=cache_dir
     )
 
     mmex_categories_extractor.execute()
 
 
-if __name__ == "__main__":
-    base_output_path: pathlib.Path = pathlib.Path.cwd() / "data"
+def extract_all_ledger_categories(input_paths: list[pathlib.Path], output_path: pathlib.Path) -> None:
+    """Extract the categories of several ledger files, merging them into the same output file.
+
+    Args:
+        input_paths (list[pathlib.Path]): The paths to the ledger csv reports.
+        output_path (pathlib.Path): The path to the output file.
+
+    Returns:
+        None
+    """
+    for input_path in input_paths:
+        extract_ledger_categories(input_path, output_path)
+
+
+def load_model(model_name: str) -> Any:
+    """Load the sentence transformer model used to map the categories.
+
+    The import is done here so that the (slow) import of torch happens in the worker thread, overlapped with the
+    extraction stages.
+
+    Args:
+        model_name (str): The name of the sentence transformer model.
+
+    Returns:
+        SentenceTransformer: The loaded model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def map_categories(
+    ledger_categories_path: pathlib.Path,
+    mmex_categories_path: pathlib.Path,
+    output_path: pathlib.Path,
+    model_name: str,
+    model: Any = None,
+) -> None:
+    """Map the ledger categories to the MMEX ones and merge the result into the mapped categories file.
+
+    Args:
+        ledger_categories_path (pathlib.Path): The path to the ledger categories json file.
+        mmex_categories_path (pathlib.Path): The path to the MMEX categories json file.
+        output_path (pathlib.Path): The path to the mapped categories json file.
+        model_name (str): The name of the sentence transformer model, used if model is None.
+        model (SentenceTransformer | None, optional): An already loaded model. Defaults to None.
+
+    Returns:
+        None
+    """
+    from mapper.categories_mapper import CategoriesMapper
 
-    ledger_input_path: str = "~/Nextcloud/Note/Finanze/ledger/2022.csv"
-    ledger_output_path: pathlib.Path = base_output_path / "ledger_categories.json"
+    mapper: CategoriesMapper = CategoriesMapper(ledger_categories_path, mmex_categories_path, model_name, model=model)
+    mapper.save_mapped_categories(output_path)
 
-    extract_ledger_categories(ledger_input_path, ledger_output_path)
 
-    mmex_input_path: str = "/home/paolo/Nextcloud/MoneyManager/finances.mmb"
-    mmex_output_path: pathlib.Path = base_output_path / "mmex_categories.json"
+def build_pipeline(args: argparse.Namespace) -> Pipeline:
+    """Build the pipeline going from the ledger csv reports to the MMEX database.
 
-    extract_mmex_categories(mmex_input_path, mmex_output_path)
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        Pipeline: The pipeline ready to be run.
+    """
+    data_dir: pathlib.Path = args.data_dir.expanduser()
+    mmex_path: pathlib.Path = args.mmex_path.expanduser()
+    ledger_paths: dict[int, pathlib.Path] = {year: args.ledger_dir.expanduser() / f"{year}.csv" for year in args.years}
+    converted_paths: dict[int, pathlib.Path] = {year: data_dir / f"{year}.csv" for year in args.years}
+
+    ledger_categories_path: pathlib.Path = data_dir / "ledger_categories.json"
+    mmex_categories_path: pathlib.Path = data_dir / "mmex_categories.json"
+    mapped_categories_path: pathlib.Path = data_dir / "mapped_categories.json"
+    fx_rates_path: pathlib.Path = (args.fx_rates or data_dir / "fx_rates.csv").expanduser()
+
+    cache: StageCache = StageCache(None if args.no_cache else args.cache_path.expanduser())
+    lookups_dir: pathlib.Path | None = None if args.no_cache else args.cache_path.expanduser().with_name("lookups")
+
+    map_stage: Stage = Stage(
+        name="map_categories",
+        function=partial(
+            map_categories, ledger_categories_path, mmex_categories_path, mapped_categories_path, args.model_name
+        ),
+        inputs=[ledger_categories_path, mmex_categories_path],
+        outputs=[mapped_categories_path],
+        dependencies=["extract_ledger_categories", "extract_mmex_categories"],
+    )
+
+    stages: list[Stage] = [
+        Stage(
+            name="extract_ledger_categories",
+            function=partial(extract_all_ledger_categories, list(ledger_paths.values()), ledger_categories_path),
+            inputs=list(ledger_paths.values()),
+            outputs=[ledger_categories_path],
+        ),
+        Stage(
+            name="extract_mmex_categories",
+            function=partial(extract_mmex_categories, mmex_path, mmex_categories_path, lookups_dir),
+            inputs=[mmex_path],
+            outputs=[mmex_categories_path],
+        ),
+        map_stage,
+    ]
+
+    # Loading the model is the slowest step, start it together with the extractions but only if the mapping is stale
+    if not cache.is_fresh(map_stage):
+        stages.append(Stage(name="model", function=partial(load_model, args.model_name), cacheable=False))
+        map_stage.dependencies.append("model")
+        map_stage.consumes.append("model")
+
+    for year in args.years:
+        stages.append(
+            Stage(
+                name=f"convert_{year}",
+                function=partial(
+                    convert_ledger_file,
+                    ledger_paths[year],
+                    converted_paths[year],
+                    mapped_categories_path,
+                    fx_rates_path,
+                ),
+                inputs=[ledger_paths[year], mapped_categories_path, fx_rates_path],
+                outputs=[converted_paths[year], splits_path(converted_paths[year])],
+                dependencies=["map_categories"],
+                executor="process",
+            )
+        )
+
+    if not args.skip_import:
+        stages.append(
+            Stage(
+                name="import",
+                function=partial(
+                    import_converted_files,
+                    list(converted_paths.values()),
+                    mmex_path,
+                    dry_run=args.dry_run,
+                    fx_rates_path=fx_rates_path,
+                    reproducible=args.reproducible,
+                    cache_dir=lookups_dir,
+                ),
+                inputs=[*converted_paths.values(), *map(splits_path, converted_paths.values()), fx_rates_path],
+                dependencies=[f"convert_{year}" for year in args.years],
+                cacheable=not args.dry_run,
+            )
+        )
+
+    stages.append(
+        Stage(
+            name="reconcile",
+            function=partial(
+                reconcile,
+                list(ledger_paths.values()),
+                mmex_path,
+                args.cache_path.expanduser().with_name("reconciliation_checkpoints.json"),
+                data_dir / "reconciliation.csv",
+            ),
+            inputs=[*ledger_paths.values(), mmex_path],
+            outputs=[data_dir / "reconciliation.csv"],
+            dependencies=[] if args.skip_import else ["import"],
+        )
+    )
+
+    return Pipeline(stages, cache, max_workers=args.workers)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments of the pipeline.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Extract, map, convert and import the ledger transactions into MMEX."
+    )
+    parser.add_argument("--ledger-dir", type=pathlib.Path, default=pathlib.Path(DEFAULT_LEDGER_DIR))
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS)
+    parser.add_argument("--mmex-path", type=pathlib.Path, default=pathlib.Path(DEFAULT_MMEX_PATH))
+    parser.add_argument("--data-dir", type=pathlib.Path, default=pathlib.Path.cwd() / "data")
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    parser.add_argument(
+        "--fx-rates",
+        type=pathlib.Path,
+        default=None,
+        help="csv file with the DATE,CURRENCY,RATE exchange rates (default: <data-dir>/fx_rates.csv)",
+    )
+    parser.add_argument("--cache-path", type=pathlib.Path, default=pathlib.Path.cwd() / ".cache" / "pipeline.json")
+    parser.add_argument("--no-cache", action="store_true", help="run every stage even if its inputs did not change")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of workers of each executor")
+    parser.add_argument("--skip-import", action="store_true", help="stop after converting the ledger files")
+    parser.add_argument("--dry-run", action="store_true", help="import on an in-memory copy of the MMEX database")
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="make the outputs depend only on the inputs, so that unchanged inputs give byte-identical outputs",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    build_pipeline(parse_args()).run()
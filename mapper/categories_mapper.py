@@ -2,19 +2,25 @@ import json
 import pathlib
 from typing import Self
 
-import torch
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from mapper.similarity import rank_candidates
 
 # model: SentenceTransformer = SentenceTransformer("distiluse-base-multilingual-cased-v1")
 
 
 class CategoriesMapper:
     def __init__(
-        self: Self, ledger_file_path: str | pathlib.Path, mmex_file_path: str | pathlib.Path, model_name: str
+        self: Self,
+        ledger_file_path: str | pathlib.Path,
+        mmex_file_path: str | pathlib.Path,
+        model_name: str,
+        model: SentenceTransformer | None = None,
     ) -> None:
         self.ledger_categories: list[str] = self._open_file(ledger_file_path)
         self.mmex_categories: list[str] = self._open_file(mmex_file_path)
-        self.model: SentenceTransformer = SentenceTransformer(model_name)
+        self.model: SentenceTransformer = model if model is not None else SentenceTransformer(model_name)
 
     def _open_file(self: Self, path: str | pathlib.Path) -> list[str]:
         if not isinstance(path, (str, pathlib.Path)):
@@ -27,14 +33,26 @@ class CategoriesMapper:
             return json.load(file)
 
     def map_ledger_to_mmex(self: Self) -> dict[str, str]:
-        ledger_embeddings: torch.Tensor = self.model.encode(self.ledger_categories)
-        mapped_categories: dict[str, str] = {}
-        for category in self.mmex_categories:
-            embedding: torch.Tensor = self.model.encode(category)
-            most_similar_index: int = util.pytorch_cos_sim(embedding, ledger_embeddings).argmax().item()
-            mapped_categories[self.ledger_categories[most_similar_index]] = category
-
-        return mapped_categories
+        # Every ledger category gets its most similar MMEX category, ranked as in mapper.evaluation
+        ledger_embeddings: np.ndarray = np.asarray(self.model.encode(self.ledger_categories))
+        mmex_embeddings: np.ndarray = np.asarray(self.model.encode(self.mmex_categories))
+        best_matches: np.ndarray = rank_candidates(ledger_embeddings, mmex_embeddings, top_k=1)[:, 0]
+
+        return {
+            ledger_category: self.mmex_categories[index]
+            for ledger_category, index in zip(self.ledger_categories, best_matches.tolist())
+        }
+
+    def save_mapped_categories(self: Self, output_path: str | pathlib.Path) -> None:
+        output_path = pathlib.Path(output_path)
+        mapped_categories: dict[str, str] = self.map_ledger_to_mmex()
+
+        if output_path.exists():
+            mapped_categories.update(self._open_file(output_path))
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with output_path.open("w") as file:
+            json.dump(dict(sorted(mapped_categories.items())), file, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,287 @@
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import pathlib
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Self
+
+import numpy as np
+import pandas as pd
+
+from mapper.similarity import normalize_rows, rank_candidates
+
+TFIDF_BASELINE: str = "tfidf-char"
+DEFAULT_MODELS: list[str] = [
+    TFIDF_BASELINE,
+    "distiluse-base-multilingual-cased-v1",
+    "paraphrase-multilingual-MiniLM-L12-v2",
+]
+NGRAM_RANGE: tuple[int, int] = (2, 4)
+TOP_K: int = 3
+REPORT_COLUMNS: list[str] = [
+    "MODEL",
+    "TOP1_ACCURACY",
+    "TOP3_ACCURACY",
+    "LOAD_SECONDS",
+    "ENCODE_PER_SECOND",
+    "PEAK_MEMORY_MB",
+    "ERROR",
+]
+
+
+class CharNgramTfidf:
+    """CharNgramTfidf is a character n-gram TF-IDF encoder, the dependency free baseline of the evaluation.
+
+    It exposes the same encode method as a SentenceTransformer, so that both are evaluated in the same way.
+
+    Attributes:
+        ngram_range (tuple[int, int]): The minimum and maximum length of the n-grams.
+        vocabulary (dict[str, int]): A dictionary mapping each n-gram to its column.
+        idf (np.ndarray): The inverse document frequency of every n-gram.
+    """
+
+    def __init__(self: Self, ngram_range: tuple[int, int] = NGRAM_RANGE) -> None:
+        """Initialize an empty encoder.
+
+        Args:
+            ngram_range (tuple[int, int], optional): The minimum and maximum length of the n-grams. Defaults to (2, 4).
+
+        Returns:
+            None
+        """
+        self.ngram_range: tuple[int, int] = ngram_range
+        self.vocabulary: dict[str, int] = {}
+        self.idf: np.ndarray = np.empty(0)
+
+    def ngrams(self: Self, text: str) -> collections.Counter:
+        """Count the character n-grams of a text, padded with a space on both sides.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            collections.Counter: The count of every n-gram.
+        """
+        padded: str = f" {text.casefold()} "
+        return collections.Counter(
+            padded[start : start + size]
+            for size in range(self.ngram_range[0], self.ngram_range[1] + 1)
+            for start in range(len(padded) - size + 1)
+        )
+
+    def fit(self: Self, texts: list[str]) -> Self:
+        """Build the vocabulary and the smoothed inverse document frequencies.
+
+        Args:
+            texts (list[str]): The texts of the corpus.
+
+        Returns:
+            CharNgramTfidf: The fitted encoder.
+        """
+        document_frequency: collections.Counter = collections.Counter()
+        for text in texts:
+            document_frequency.update(self.ngrams(text).keys())
+
+        self.vocabulary = {ngram: column for column, ngram in enumerate(sorted(document_frequency))}
+        frequencies: np.ndarray = np.array([document_frequency[ngram] for ngram in self.vocabulary], dtype=float)
+        self.idf = np.log((1 + len(texts)) / (1 + frequencies)) + 1
+        return self
+
+    def encode(self: Self, texts: list[str]) -> np.ndarray:
+        """Encode the texts as L2 normalized TF-IDF vectors, ignoring the n-grams outside of the vocabulary.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Returns:
+            np.ndarray: A (texts, vocabulary) matrix.
+        """
+        vectors: np.ndarray = np.zeros((len(texts), len(self.vocabulary)))
+        for row, text in enumerate(texts):
+            for ngram, count in self.ngrams(text).items():
+                column: int | None = self.vocabulary.get(ngram)
+                if column is not None:
+                    vectors[row, column] = count
+
+        return normalize_rows(vectors * self.idf)
+
+
+def load_encoder(model_name: str, corpus: list[str]) -> Any:
+    """Load the encoder of a model, the TF-IDF baseline being fitted on the corpus.
+
+    Args:
+        model_name (str): The name of a sentence transformer model, or "tfidf-char" for the baseline.
+        corpus (list[str]): The texts that will be encoded.
+
+    Returns:
+        CharNgramTfidf | SentenceTransformer: The encoder.
+    """
+    if model_name == TFIDF_BASELINE:
+        return CharNgramTfidf().fit(corpus)
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def peak_memory_mb() -> float:
+    """Read the peak resident memory of the current process.
+
+    Returns:
+        float: The peak resident set size in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def evaluate_model(
+    model_name: str, queries: list[str], candidates: list[str], targets: list[int], repeats: int = 1
+) -> dict[str, str | float]:
+    """Evaluate a model on the gold mapping, timing the load and the encoding.
+
+    Every ledger category of the gold set is a query, the candidates are ranked by cosine similarity as the mapper
+    does and the query is correct at k if its gold MMEX category is among the first k candidates. Meant to be run in
+    a fresh process, so that the peak memory only includes this model.
+
+    Args:
+        model_name (str): The name of a sentence transformer model, or "tfidf-char" for the baseline.
+        queries (list[str]): The ledger categories of the gold set.
+        candidates (list[str]): The MMEX categories.
+        targets (list[int]): The index in candidates of the gold MMEX category of every query.
+        repeats (int, optional): The number of encoding passes the throughput is averaged on. Defaults to 1.
+
+    Returns:
+        dict[str, str | float]: The report row of the model.
+    """
+    memory_before: float = peak_memory_mb()
+
+    start: float = time.perf_counter()
+    encoder: Any = load_encoder(model_name, queries + candidates)
+    load_seconds: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        query_embeddings: np.ndarray = np.asarray(encoder.encode(queries))
+        candidate_embeddings: np.ndarray = np.asarray(encoder.encode(candidates))
+    encode_seconds: float = time.perf_counter() - start
+
+    ranking: np.ndarray = rank_candidates(query_embeddings, candidate_embeddings, TOP_K)
+    hits: np.ndarray = ranking == np.asarray(targets)[:, None]
+
+    return {
+        "MODEL": model_name,
+        "TOP1_ACCURACY": hits[:, 0].mean(),
+        "TOP3_ACCURACY": hits.any(axis=1).mean(),
+        "LOAD_SECONDS": load_seconds,
+        "ENCODE_PER_SECOND": repeats * (len(queries) + len(candidates)) / encode_seconds,
+        "PEAK_MEMORY_MB": peak_memory_mb() - memory_before,
+        "ERROR": "",
+    }
+
+
+def load_gold_set(
+    gold_path: str | pathlib.Path, candidates_path: str | pathlib.Path
+) -> tuple[list[str], list[str], list[int]]:
+    """Load the hand curated mapping and the MMEX categories it is evaluated against.
+
+    Args:
+        gold_path (str | pathlib.Path): The path to the mapped categories json file.
+        candidates_path (str | pathlib.Path): The path to the MMEX categories json file.
+
+    Returns:
+        tuple[list[str], list[str], list[int]]: The ledger categories, the MMEX categories (the gold ones that are
+            missing from the candidates file included) and the index of the gold MMEX category of every ledger one.
+    """
+    with pathlib.Path(gold_path).open("r") as file:
+        gold: dict[str, str] = json.load(file)
+    with pathlib.Path(candidates_path).open("r") as file:
+        candidates: list[str] = json.load(file)
+
+    candidates = sorted(set(candidates) | set(gold.values()))
+    positions: dict[str, int] = {category: position for position, category in enumerate(candidates)}
+    queries: list[str] = sorted(gold)
+    return queries, candidates, [positions[gold[query]] for query in queries]
+
+
+def evaluate_models(
+    model_names: list[str],
+    gold_path: str | pathlib.Path,
+    candidates_path: str | pathlib.Path,
+    repeats: int = 1,
+) -> pd.DataFrame:
+    """Evaluate several models on the gold mapping, each one in its own process.
+
+    A model that fails to load or to encode is reported with its error instead of stopping the evaluation.
+
+    Args:
+        model_names (list[str]): The names of the models to evaluate.
+        gold_path (str | pathlib.Path): The path to the mapped categories json file.
+        candidates_path (str | pathlib.Path): The path to the MMEX categories json file.
+        repeats (int, optional): The number of encoding passes the throughput is averaged on. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: The report, one row per model.
+
+    Examples:
+        >>> evaluate_models(["tfidf-char"], "data/mapped_categories.json", "data/mmex_categories.json")
+    """
+    queries, candidates, targets = load_gold_set(gold_path, candidates_path)
+    rows: list[dict[str, str | float]] = []
+
+    for model_name in model_names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            try:
+                rows.append(
+                    executor.submit(evaluate_model, model_name, queries, candidates, targets, repeats).result()
+                )
+            except Exception as error:
+                rows.append({"MODEL": model_name, "ERROR": f"{type(error).__name__}: {error}"})
+
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS).fillna({"ERROR": ""})
+
+
+def pick_model(report: pd.DataFrame, min_accuracy: float) -> str | None:
+    """Pick the model with the highest encoding throughput among the ones meeting the accuracy bar.
+
+    Args:
+        report (pd.DataFrame): The report returned by evaluate_models.
+        min_accuracy (float): The minimum top-1 accuracy.
+
+    Returns:
+        str | None: The name of the model, None if no model meets the bar.
+    """
+    eligible: pd.DataFrame = report[report.TOP1_ACCURACY >= min_accuracy]
+    if eligible.empty:
+        return None
+
+    return eligible.sort_values(["ENCODE_PER_SECOND", "LOAD_SECONDS"], ascending=[False, True]).MODEL.iloc[0]
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Evaluate the category mapping models against the hand curated mapping."
+    )
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help=f"'{TFIDF_BASELINE}' is the baseline")
+    parser.add_argument("--gold", type=pathlib.Path, default=pathlib.Path("data/mapped_categories.json"))
+    parser.add_argument("--candidates", type=pathlib.Path, default=pathlib.Path("data/mmex_categories.json"))
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="csv file to save the report to")
+    parser.add_argument("--repeats", type=int, default=3, help="encoding passes the throughput is averaged on")
+    parser.add_argument("--min-accuracy", type=float, default=math.nan, help="top-1 accuracy bar of the pick")
+    args: argparse.Namespace = parser.parse_args()
+
+    evaluation: pd.DataFrame = evaluate_models(args.models, args.gold, args.candidates, args.repeats)
+    print(evaluation.to_string(index=False, float_format="{:.3f}".format))
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        evaluation.to_csv(args.output, index=False)
+
+    if not math.isnan(args.min_accuracy):
+        picked: str | None = pick_model(evaluation, args.min_accuracy)
+        if picked is None:
+            print(f"no model reaches a top-1 accuracy of {args.min_accuracy}")
+        else:
+            print(f"fastest model with a top-1 accuracy of at least {args.min_accuracy}: {picked}")
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length, so that dot products are cosine similarities.
+
+    Args:
+        vectors (np.ndarray): The vectors.
+
+    Returns:
+        np.ndarray: The normalized vectors, the null rows are left untouched.
+    """
+    norms: np.ndarray = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def rank_candidates(query_embeddings: np.ndarray, candidate_embeddings: np.ndarray, top_k: int) -> np.ndarray:
+    """Rank the candidates of every query by cosine similarity.
+
+    Both the mapper and its evaluation rank the MMEX categories (the candidates) for every ledger category (the
+    queries), so that the evaluation measures the mapping that is actually saved.
+
+    Args:
+        query_embeddings (np.ndarray): A (queries, dimensions) matrix.
+        candidate_embeddings (np.ndarray): A (candidates, dimensions) matrix.
+        top_k (int): The number of candidates kept for every query.
+
+    Returns:
+        np.ndarray: A (queries, top_k) matrix with the candidate indices, the most similar first and the ties broken
+            by candidate order.
+    """
+    similarities: np.ndarray = normalize_rows(query_embeddings) @ normalize_rows(candidate_embeddings).T
+    return np.argsort(-similarities, axis=1, kind="stable")[:, :top_k]
@@ -0,0 +1,260 @@
+import argparse
+import itertools
+import json
+import pathlib
+import sqlite3
+from typing import IO, Iterator
+
+from data_preprocessing import conto_map
+
+DEFAULT_BATCH_SIZE: int = 1000
+LEDGER_STATUS: dict[str, str] = {"R": "* ", "F": "! "}
+ACCOUNT_WIDTH: int = 46
+
+EXPORT_QUERY: str = """
+    WITH RECURSIVE CATEGORY_PATH (CATEGID, PATH) AS (
+        SELECT CATEGID, CATEGNAME FROM CATEGORY_V1 WHERE PARENTID = -1
+        UNION ALL
+        SELECT c.CATEGID, p.PATH || ':' || c.CATEGNAME
+        FROM CATEGORY_V1 c JOIN CATEGORY_PATH p ON c.PARENTID = p.CATEGID
+    )
+    SELECT
+        t.TRANSID,
+        SUBSTR(t.TRANSDATE, 1, 10),
+        t.TRANSCODE,
+        t.STATUS,
+        t.TRANSAMOUNT,
+        t.TOTRANSAMOUNT,
+        t.NOTES,
+        a.ACCOUNTNAME,
+        ca.CURRENCY_SYMBOL,
+        b.ACCOUNTNAME,
+        cb.CURRENCY_SYMBOL,
+        p.PAYEENAME,
+        COALESCE(sp.PATH, tp.PATH),
+        COALESCE(s.SPLITTRANSAMOUNT, t.TRANSAMOUNT)
+    FROM
+        CHECKINGACCOUNT_V1 t
+    JOIN ACCOUNTLIST_V1 a ON a.ACCOUNTID = t.ACCOUNTID
+    LEFT JOIN CURRENCYFORMATS_V1 ca ON ca.CURRENCYID = a.CURRENCYID
+    LEFT JOIN ACCOUNTLIST_V1 b ON b.ACCOUNTID = t.TOACCOUNTID
+    LEFT JOIN CURRENCYFORMATS_V1 cb ON cb.CURRENCYID = b.CURRENCYID
+    LEFT JOIN PAYEE_V1 p ON p.PAYEEID = t.PAYEEID
+    LEFT JOIN CATEGORY_PATH tp ON tp.CATEGID = t.CATEGID
+    LEFT JOIN SPLITTRANSACTIONS_V1 s ON s.TRANSID = t.TRANSID
+    LEFT JOIN CATEGORY_PATH sp ON sp.CATEGID = s.CATEGID
+    WHERE
+        t.STATUS != 'V'
+        AND COALESCE(t.DELETEDTIME, '') = ''
+        AND SUBSTR(t.TRANSDATE, 1, 10) > ?
+        AND (? = '' OR COALESCE(t.LASTUPDATEDTIME, '') > ?)
+    ORDER BY
+        t.TRANSDATE, t.TRANSID, s.SPLITTRANSID
+"""
+
+
+def invert_mapped_categories(mapped_categories: dict[str, str]) -> dict[str, str]:
+    """Invert the ledger to MMEX categories mapping.
+
+    Several ledger categories can map to the same MMEX one, in that case the ledger category whose leaf is the same as
+    the MMEX leaf is preferred, then the most specific (deepest) one, and the remaining ties are broken alphabetically
+    so that the export is stable.
+
+    Args:
+        mapped_categories (dict[str, str]): A dictionary mapping each ledger category to its MMEX category.
+
+    Returns:
+        dict[str, str]: A dictionary mapping each MMEX category to a ledger category.
+    """
+
+    def preference(item: tuple[str, str]) -> tuple[bool, int, str]:
+        ledger_category, mmex_category = item
+        same_leaf: bool = ledger_category.split(":")[-1].casefold() == mmex_category.split(":")[-1].casefold()
+        return not same_leaf, -ledger_category.count(":"), ledger_category
+
+    inverted: dict[str, str] = {}
+    for ledger_category, mmex_category in sorted(mapped_categories.items(), key=preference):
+        inverted.setdefault(mmex_category, ledger_category)
+    return inverted
+
+
+def stream_transactions(
+    connection: sqlite3.Connection, since: str = "", batch_size: int = DEFAULT_BATCH_SIZE, updated_since: str = ""
+) -> Iterator[list[tuple]]:
+    """Stream the MMEX transactions, each one as the list of its rows (one row per split).
+
+    The rows are fetched from the cursor in batches of batch_size, so memory does not depend on the history size.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        since (str, optional): Only the transactions strictly after this ISO date are exported. Defaults to "".
+        batch_size (int, optional): The number of rows fetched at a time. Defaults to 1000.
+        updated_since (str, optional): Only the transactions whose LASTUPDATEDTIME is strictly after this timestamp
+            are exported. Defaults to "" (no filter).
+
+    Yields:
+        list[tuple]: The rows of a transaction.
+    """
+    cursor: sqlite3.Cursor = connection.cursor()
+    cursor.arraysize = batch_size
+    cursor.execute(EXPORT_QUERY, (since, updated_since, updated_since))
+
+    def rows() -> Iterator[tuple]:
+        while batch := cursor.fetchmany():
+            yield from batch
+
+    for _, transaction_rows in itertools.groupby(rows(), key=lambda row: row[0]):
+        yield list(transaction_rows)
+
+    cursor.close()
+
+
+def format_posting(account: str, amount: float | None = None, currency: str | None = None) -> str:
+    """Format a ledger posting, aligning the amounts on the same column.
+
+    Args:
+        account (str): The ledger account.
+        amount (float | None, optional): The amount, None to let ledger infer it. Defaults to None.
+        currency (str | None, optional): The currency of the amount. Defaults to None.
+
+    Returns:
+        str: The posting line.
+    """
+    if amount is None:
+        return f"    {account}\n"
+
+    formatted_amount: str = f"{amount:.2f} {currency or ''}".rstrip()
+    return f"    {account:<{ACCOUNT_WIDTH}}  {formatted_amount:>12}\n"
+
+
+def format_transaction(rows: list[tuple], inverted_categories: dict[str, str], account_names: dict[str, str]) -> str:
+    """Format the rows of a MMEX transaction as a ledger journal entry.
+
+    Args:
+        rows (list[tuple]): The rows of the transaction, as yielded by stream_transactions.
+        inverted_categories (dict[str, str]): A dictionary mapping each MMEX category to a ledger category.
+        account_names (dict[str, str]): A dictionary mapping the MMEX account names to the ledger ones.
+
+    Returns:
+        str: The journal entry.
+    """
+    (
+        _,
+        date,
+        transaction_type,
+        status,
+        amount,
+        to_amount,
+        notes,
+        account,
+        currency,
+        to_account,
+        to_currency,
+        payee,
+        _,
+        _,
+    ) = rows[0]
+
+    # The importer keeps the whole ledger description in the notes, which then already start with the payee
+    description: str = notes or payee or ""
+    if payee and notes and not notes.startswith(payee):
+        description = f"{payee} | {notes}"
+    asset_account: str = f"Assets:{account_names.get(account, account)}"
+    entry: str = f"{date.replace('-', '/')} {LEDGER_STATUS.get(status, '')}{description}\n"
+
+    if transaction_type == "Transfer":
+        to_asset_account: str = f"Assets:{account_names.get(to_account, to_account)}"
+        entry += format_posting(to_asset_account, to_amount, to_currency)
+        entry += format_posting(asset_account, -amount, currency)
+        return entry + "\n"
+
+    root: str = "Guadagni" if transaction_type == "Deposit" else "Spese"
+    sign: float = -1.0 if transaction_type == "Deposit" else 1.0
+    for *_, category, split_amount in rows:
+        ledger_category: str = inverted_categories.get(category) or f"{root}:{category or 'Altro'}"
+        entry += format_posting(ledger_category, sign * split_amount, currency)
+    entry += format_posting(asset_account)
+    return entry + "\n"
+
+
+def export_transactions(
+    connection: sqlite3.Connection,
+    output: IO[str],
+    mapped_categories: dict[str, str],
+    since: str = "",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    updated_since: str = "",
+) -> int:
+    """Write the MMEX transactions to a ledger journal, one entry at a time.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        output (IO[str]): The text stream the journal is written to.
+        mapped_categories (dict[str, str]): A dictionary mapping each ledger category to its MMEX category.
+        since (str, optional): Only the transactions strictly after this ISO date are exported. Defaults to "".
+        batch_size (int, optional): The number of rows fetched at a time. Defaults to 1000.
+        updated_since (str, optional): Only the transactions whose LASTUPDATEDTIME is strictly after this timestamp
+            are exported. Defaults to "" (no filter).
+
+    Returns:
+        int: The number of exported transactions.
+    """
+    inverted_categories: dict[str, str] = invert_mapped_categories(mapped_categories)
+    account_names: dict[str, str] = {mmex_name: ledger_name for ledger_name, mmex_name in conto_map.items()}
+
+    count: int = 0
+    for rows in stream_transactions(connection, since, batch_size, updated_since):
+        output.write(format_transaction(rows, inverted_categories, account_names))
+        count += 1
+    return count
+
+
+def export_mmex_to_ledger(
+    mmex_path: str | pathlib.Path,
+    output_path: str | pathlib.Path,
+    mapped_categories_path: str | pathlib.Path,
+    since: str = "",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Export the transactions of a MMEX database to a ledger journal file.
+
+    Args:
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        output_path (str | pathlib.Path): The path to the ledger journal to write.
+        mapped_categories_path (str | pathlib.Path): The path to the mapped categories json file.
+        since (str, optional): Only the transactions strictly after this ISO date are exported. Defaults to "".
+        batch_size (int, optional): The number of rows fetched at a time. Defaults to 1000.
+
+    Returns:
+        int: The number of exported transactions.
+
+    Examples:
+        >>> export_mmex_to_ledger("finances.mmb", "mmex.ledger", "data/mapped_categories.json", since="2023-12-31")
+    """
+    with pathlib.Path(mapped_categories_path).open("r") as file:
+        mapped_categories: dict[str, str] = json.load(file)
+
+    output_path = pathlib.Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    connection: sqlite3.Connection = sqlite3.connect(f"file:{pathlib.Path(mmex_path)}?mode=ro", uri=True)
+    try:
+        with output_path.open("w") as output:
+            return export_transactions(connection, output, mapped_categories, since, batch_size)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Export MMEX transactions to ledger.")
+    parser.add_argument("mmex_path", type=pathlib.Path)
+    parser.add_argument("output_path", type=pathlib.Path)
+    parser.add_argument("--mapped-categories", type=pathlib.Path, default=pathlib.Path("data/mapped_categories.json"))
+    parser.add_argument("--since", default="", help="export only the transactions after this ISO date")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args: argparse.Namespace = parser.parse_args()
+
+    exported: int = export_mmex_to_ledger(
+        args.mmex_path, args.output_path, args.mapped_categories, args.since, args.batch_size
+    )
+    print(f"{exported} transactions exported to {args.output_path}")
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import pathlib
+import pickle
+import sqlite3
+import struct
+
+import pandas as pd
+
+SQLITE_HEADER_SIZE: int = 100
+
+
+def database_version(path: str | pathlib.Path) -> tuple[int, int, int, int, int, int]:
+    """Compute a version key that changes every time the database is modified.
+
+    The key is made of the file change counter and the schema cookie stored in the SQLite header (the values behind
+    PRAGMA data_version and PRAGMA schema_version, readable without opening a connection), plus the modification time
+    and the size of the database file and of its write-ahead log. In WAL mode the commits are appended to the -wal
+    file and reach the database file (and its header) only at the next checkpoint, so the log has to be part of the key.
+
+    Args:
+        path (str | pathlib.Path): The path to the SQLite database.
+
+    Returns:
+        tuple[int, int, int, int, int, int]: The change counter, the schema cookie, the modification time in ns and
+            the size of the database file, then the modification time in ns and the size of the -wal file (0 and 0
+            when there is none).
+    """
+    path = pathlib.Path(path)
+    with path.open("rb") as file:
+        header: bytes = file.read(SQLITE_HEADER_SIZE)
+
+    change_counter, schema_cookie = struct.unpack(">I12xI", header[24:44])
+    stat: os.stat_result = path.stat()
+    wal_path: pathlib.Path = path.with_name(f"{path.name}-wal")
+    wal_mtime, wal_size = (wal_path.stat().st_mtime_ns, wal_path.stat().st_size) if wal_path.exists() else (0, 0)
+    return change_counter, schema_cookie, stat.st_mtime_ns, stat.st_size, wal_mtime, wal_size
+
+
+def cached_query(
+    mmex_path: str | pathlib.Path, query: str, cache_dir: str | pathlib.Path | None = None
+) -> pd.DataFrame:
+    """Run a query on the MMEX database, serving the result from a local snapshot while the database is unchanged.
+
+    Meant for the small lookup tables (accounts, categories, payees) that are read on every run but rarely change.
+    The cache directory is chosen by the caller, as the pipeline does for its stage cache.
+
+    Args:
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        query (str): The query to run.
+        cache_dir (str | pathlib.Path | None, optional): The directory of the snapshots, None to always run the query.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: The result of the query.
+
+    Examples:
+        >>> cached_query("finances.mmb", "SELECT ACCOUNTID, ACCOUNTNAME FROM ACCOUNTLIST_V1", ".cache/lookups")
+    """
+    mmex_path = pathlib.Path(mmex_path).expanduser().resolve()
+    if cache_dir is None:
+        return read_query(mmex_path, query)
+
+    digest: str = hashlib.sha256(f"{mmex_path}\n{query}".encode()).hexdigest()[:16]
+    cache_path: pathlib.Path = pathlib.Path(cache_dir) / f"{mmex_path.stem}_{digest}.pkl"
+    version: tuple[int, int, int, int, int, int] = database_version(mmex_path)
+
+    if cache_path.exists():
+        with cache_path.open("rb") as file:
+            snapshot: dict = pickle.load(file)
+        if snapshot["version"] == version:
+            return snapshot["data"].copy()
+
+    data: pd.DataFrame = read_query(mmex_path, query)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path: pathlib.Path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with temporary_path.open("wb") as file:
+        pickle.dump({"version": version, "data": data}, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, cache_path)
+
+    return data
+
+
+def read_query(mmex_path: str | pathlib.Path, query: str) -> pd.DataFrame:
+    """Run a query on the MMEX database.
+
+    Args:
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        query (str): The query to run.
+
+    Returns:
+        pd.DataFrame: The result of the query.
+    """
+    with sqlite3.connect(mmex_path) as connection:
+        data: pd.DataFrame = pd.read_sql_query(query, connection)
+    connection.close()
+
+    return data
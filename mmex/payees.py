@@ -0,0 +1,90 @@
+import difflib
+import re
+import sqlite3
+import unicodedata
+
+import pandas as pd
+
+FUZZY_MATCH_CUTOFF: float = 0.88
+
+
+def normalize_payee_name(name: str) -> str:
+    """Normalize a payee name into the key used to match it against the MMEX payees.
+
+    Args:
+        name (str): The payee name.
+
+    Returns:
+        str: The name without accents, punctuation and repeated whitespace, casefolded.
+
+    Examples:
+        >>> normalize_payee_name("  Caffè  Nero S.r.l. ")
+        'caffe nero srl'
+    """
+    decomposed: str = unicodedata.normalize("NFKD", name)
+    without_accents: str = "".join(char for char in decomposed if not unicodedata.combining(char))
+    without_punctuation: str = re.sub(r"[^\w\s]", "", without_accents)
+    return " ".join(without_punctuation.split()).casefold()
+
+
+def resolve_payees(
+    names: pd.Series, payees: pd.DataFrame, cutoff: float = FUZZY_MATCH_CUTOFF
+) -> pd.Series:
+    """Find the MMEX payee of every name, by exact normalized match first and by fuzzy match as a fallback.
+
+    Only the distinct names are normalized and matched, the result is then mapped back onto the whole column.
+
+    Args:
+        names (pd.Series): The payee names, NaN where the transaction has no payee.
+        payees (pd.DataFrame): The MMEX payees, with the PAYEEID and PAYEENAME columns.
+        cutoff (float, optional): The minimum similarity ratio of a fuzzy match. Defaults to 0.88.
+
+    Returns:
+        pd.Series: The PAYEEID of every name, NaN where no payee matched.
+    """
+    index: dict[str, int] = {}
+    for payee_id, payee_name in zip(payees.PAYEEID, payees.PAYEENAME):
+        index.setdefault(normalize_payee_name(payee_name), payee_id)
+
+    known_keys: list[str] = list(index)
+    matches: dict[str, int] = {}
+    for name in names.dropna().unique():
+        key: str = normalize_payee_name(name)
+        if key in index:
+            matches[name] = index[key]
+            continue
+
+        close_matches: list[str] = difflib.get_close_matches(key, known_keys, n=1, cutoff=cutoff)
+        if close_matches:
+            matches[name] = index[close_matches[0]]
+
+    return names.map(matches)
+
+
+def create_payees(connection: sqlite3.Connection, names: list[str]) -> dict[str, int]:
+    """Insert the given payees into the MMEX database in a single batch.
+
+    Names that normalize to the same key are created only once. The payees are created active, as MMEX hides the
+    inactive ones from its payee lists.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        names (list[str]): The names of the payees to create.
+
+    Returns:
+        dict[str, int]: A dictionary mapping each name to the PAYEEID of its payee.
+    """
+    first_payee_id: int = connection.execute("SELECT COALESCE(MAX(PAYEEID), 0) + 1 FROM PAYEE_V1").fetchone()[0]
+
+    new_payees: dict[str, tuple[int, str]] = {}
+    payee_ids: dict[str, int] = {}
+    for name in names:
+        key: str = normalize_payee_name(name)
+        if key not in new_payees:
+            new_payees[key] = (first_payee_id + len(new_payees), name)
+        payee_ids[name] = new_payees[key][0]
+
+    connection.executemany(
+        "INSERT INTO PAYEE_V1 (PAYEEID, PAYEENAME, CATEGID, ACTIVE) VALUES (?, ?, -1, 1)", list(new_payees.values())
+    )
+    return payee_ids
@@ -0,0 +1,149 @@
+import csv
+import pathlib
+import sqlite3
+from typing import Any, Iterable, Iterator, NamedTuple, Sequence
+
+import pandas as pd
+
+CONVERTED_COLUMNS: list[str] = [
+    "Id",
+    "Data",
+    "Stato",
+    "Tipo",
+    "Conto",
+    "ToConto",
+    "Beneficiario",
+    "Importo",
+    "Valuta",
+    "ImportoA",
+    "ValutaA",
+    "Categoria",
+    "Sotto-Categoria",
+    "Note",
+]
+
+
+class ConvertedTransaction(NamedTuple):
+    """A transaction converted from ledger, as written by the converter and read by the importer.
+
+    The fields follow the order of CONVERTED_COLUMNS, the header of the converted csv files.
+
+    Attributes:
+        id (int): The id of the transaction within its converted file, referenced by the split rows.
+        date (str): The ISO date of the transaction.
+        status (str): The MMEX status of the transaction.
+        type (str): Deposit, Withdrawal or Transfer.
+        account (str): The MMEX account the transaction is registered on.
+        to_account (str | None): The destination account of a transfer.
+        payee (str | None): The payee, None for transfers.
+        amount (float): The amount, in the currency of the transaction.
+        currency (str): The currency of the transaction.
+        to_amount (float | None): The amount received by the destination account of a transfer, in to_currency.
+        to_currency (str | None): The currency of the destination account of a transfer.
+        category (str | None): The category, "" for split transactions.
+        sub_category (str | None): The sub-category, "" for split transactions.
+        notes (str): The ledger description.
+    """
+
+    id: int
+    date: str
+    status: str
+    type: str
+    account: str
+    to_account: str | None
+    payee: str | None
+    amount: float
+    currency: str
+    to_amount: float | None
+    to_currency: str | None
+    category: str | None
+    sub_category: str | None
+    notes: str
+
+
+class MmexTransaction(NamedTuple):
+    """A row of the MMEX CHECKINGACCOUNT_V1 table, the fields being named and ordered as its columns."""
+
+    TRANSID: int
+    ACCOUNTID: int
+    TOACCOUNTID: int
+    PAYEEID: int
+    TRANSCODE: str
+    TRANSAMOUNT: float
+    STATUS: str
+    TRANSACTIONNUMBER: str
+    NOTES: str
+    CATEGID: int
+    TRANSDATE: str
+    LASTUPDATEDTIME: str
+    DELETEDTIME: str
+    FOLLOWUPID: int
+    TOTRANSAMOUNT: float
+    COLOR: int
+
+
+def missing_to_none(value: Any) -> Any:
+    """Replace a missing value (NaN, NaT or NA) with None, leaving any other value untouched.
+
+    Args:
+        value (Any): A scalar value.
+
+    Returns:
+        Any: None if the value is missing, the value otherwise.
+    """
+    return None if pd.isna(value) else value
+
+
+def iter_converted_transactions(transactions: pd.DataFrame) -> Iterator[ConvertedTransaction]:
+    """Iterate over a frame of converted transactions as records, without materializing them.
+
+    The columns are read in place, without copying the frame, and missing values are yielded as None.
+
+    Args:
+        transactions (pd.DataFrame): A frame with (at least) the CONVERTED_COLUMNS.
+
+    Returns:
+        Iterator[ConvertedTransaction]: The lazy iterator over the record of every row.
+    """
+    rows: Iterator[tuple] = zip(*(transactions[column] for column in CONVERTED_COLUMNS))
+    return (ConvertedTransaction._make(map(missing_to_none, row)) for row in rows)
+
+
+def insert_transactions(connection: sqlite3.Connection, transactions: Iterable[MmexTransaction]) -> None:
+    """Insert MMEX transactions into CHECKINGACCOUNT_V1, consuming them as they are produced.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        transactions (Iterable[MmexTransaction]): The transactions to insert.
+
+    Returns:
+        None
+    """
+    connection.executemany(
+        f"INSERT INTO CHECKINGACCOUNT_V1 ({', '.join(MmexTransaction._fields)}) "
+        f"VALUES ({', '.join('?' * len(MmexTransaction._fields))})",
+        transactions,
+    )
+
+
+def tee_to_csv(
+    records: Iterable[NamedTuple], path: str | pathlib.Path, fields: Sequence[str]
+) -> Iterator[NamedTuple]:
+    """Write the records to a csv file while passing them through.
+
+    The header is written upfront, so that the file is a valid (empty) csv even when there are no records.
+
+    Args:
+        records (Iterable[NamedTuple]): The records to write.
+        path (str | pathlib.Path): The path to the csv file.
+        fields (Sequence[str]): The header of the csv file, the fields of the records.
+
+    Yields:
+        NamedTuple: The same records.
+    """
+    with pathlib.Path(path).open("w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for record in records:
+            writer.writerow(record)
+            yield record
@@ -0,0 +1,267 @@
+import contextlib
+import pathlib
+import sqlite3
+from typing import Iterator, Self
+
+from mmex.lookup_cache import database_version
+
+BALANCE_TOLERANCE: float = 0.005
+
+
+class StagingValidationError(Exception):
+    """Exception raised when the staged MMEX database fails validation."""
+
+    def __init__(self: Self, message: str = "Staged database failed validation.") -> None:
+        """Initialize a custom exception with an optional error message.
+
+        Args:
+            message (str, optional): The error message. Defaults to "Staged database failed validation."
+
+        Examples:
+            >>> raise StagingValidationError("Unknown account id 42")
+            StagingValidationError: Unknown account id 42
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+def load_into_memory(path: str | pathlib.Path) -> tuple[sqlite3.Connection, tuple[int, ...]]:
+    """Copy a SQLite database into an in-memory connection using the backup API.
+
+    The version of the file is read before the copy is started, so that a write made in between can only make the
+    write-back refuse, never be lost.
+
+    Args:
+        path (str | pathlib.Path): The path to the MMEX database.
+
+    Returns:
+        tuple[sqlite3.Connection, tuple[int, ...]]: A connection to the in-memory copy of the database and the
+            database_version of the file it was copied from.
+    """
+    memory: sqlite3.Connection = sqlite3.connect(":memory:")
+    source: sqlite3.Connection = sqlite3.connect(f"file:{pathlib.Path(path)}?mode=ro", uri=True, isolation_level=None)
+    try:
+        # The first read of a WAL database creates its -wal and -shm files, which are part of the version
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        version: tuple[int, ...] = database_version(path)
+        source.backup(memory)
+    finally:
+        source.close()
+    return memory, version
+
+
+def write_back(
+    connection: sqlite3.Connection, path: str | pathlib.Path, loaded_version: tuple[int, ...] | None = None
+) -> None:
+    """Copy the content of the given connection into the database file, under an exclusive lock.
+
+    The file is opened through SQLite and locked before anything is checked: the lock fails while another
+    application (e.g. MMEX itself) has the database open in WAL mode, and once it is held nobody can write until the
+    copy is done. The copy is a single SQLite transaction, so readers never see a partially written database. The
+    file is never replaced on disk, which would let a stale -wal file of another connection be replayed on it.
+
+    Args:
+        connection (sqlite3.Connection): The connection holding the database to persist.
+        path (str | pathlib.Path): The path to the MMEX database to overwrite.
+        loaded_version (tuple[int, ...] | None, optional): The database_version of the file when it was loaded. If
+            given and the file changed since then (e.g. a sync client pulled an edit made on another device), the
+            file is not overwritten. Defaults to None.
+
+    Raises:
+        StagingValidationError: If the database is in use by another connection or changed since it was loaded.
+
+    Returns:
+        None
+    """
+    path = pathlib.Path(path)
+    destination: sqlite3.Connection = sqlite3.connect(path, isolation_level=None, timeout=0)
+    try:
+        # In exclusive locking mode the lock taken by BEGIN EXCLUSIVE is kept after the COMMIT until the connection
+        # is closed, so it covers both the version check and the copy
+        destination.execute("PRAGMA locking_mode = EXCLUSIVE")
+        try:
+            destination.execute("BEGIN EXCLUSIVE")
+            destination.execute("COMMIT")
+        except sqlite3.OperationalError as error:
+            raise StagingValidationError(
+                f"{path} is in use by another application ({error}), the import was not written back"
+            ) from error
+
+        if loaded_version is not None and database_version(path) != loaded_version:
+            raise StagingValidationError(
+                f"{path} changed since it was loaded, the import was not written back to avoid losing those changes"
+            )
+        connection.backup(destination)
+    finally:
+        destination.close()
+
+
+def account_balances(connection: sqlite3.Connection) -> dict[int, float]:
+    """Compute the current balance of every MMEX account.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+
+    Returns:
+        dict[int, float]: A dictionary mapping each ACCOUNTID to its balance.
+    """
+    results: list = connection.execute(
+        """
+        SELECT
+            a.ACCOUNTID,
+            a.INITIALBAL + COALESCE(SUM(m.AMOUNT), 0)
+        FROM
+            ACCOUNTLIST_V1 a
+        LEFT JOIN (
+            SELECT
+                ACCOUNTID,
+                CASE TRANSCODE WHEN 'Deposit' THEN TRANSAMOUNT ELSE -TRANSAMOUNT END AS AMOUNT
+            FROM
+                CHECKINGACCOUNT_V1
+            WHERE
+                STATUS != 'V' AND COALESCE(DELETEDTIME, '') = ''
+            UNION ALL
+            SELECT
+                TOACCOUNTID,
+                TOTRANSAMOUNT
+            FROM
+                CHECKINGACCOUNT_V1
+            WHERE
+                TRANSCODE = 'Transfer' AND STATUS != 'V' AND COALESCE(DELETEDTIME, '') = ''
+        ) m ON m.ACCOUNTID = a.ACCOUNTID
+        GROUP BY
+            a.ACCOUNTID
+        """
+    ).fetchall()
+
+    return {account_id: balance for account_id, balance in results}
+
+
+def validate_database(connection: sqlite3.Connection) -> None:
+    """Check the integrity of the database and the references of every transaction.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+
+    Raises:
+        StagingValidationError: If the database is corrupted, a transaction references a missing account, category
+            or payee, or the split rows of a transaction are not valid.
+
+    Returns:
+        None
+    """
+    integrity: str = connection.execute("PRAGMA integrity_check").fetchone()[0]
+    if integrity != "ok":
+        raise StagingValidationError(f"Integrity check failed: {integrity}")
+
+    foreign_key_violations: list = connection.execute("PRAGMA foreign_key_check").fetchall()
+    if foreign_key_violations:
+        raise StagingValidationError(f"Foreign key violations: {foreign_key_violations}")
+
+    orphans: list = connection.execute(
+        """
+        SELECT
+            t.TRANSID
+        FROM
+            CHECKINGACCOUNT_V1 t
+        LEFT JOIN ACCOUNTLIST_V1 a ON a.ACCOUNTID = t.ACCOUNTID
+        LEFT JOIN ACCOUNTLIST_V1 b ON b.ACCOUNTID = t.TOACCOUNTID
+        WHERE
+            a.ACCOUNTID IS NULL
+            OR (t.TRANSCODE = 'Transfer' AND b.ACCOUNTID IS NULL)
+            OR (t.CATEGID NOT IN (-1, 0) AND t.CATEGID NOT IN (SELECT CATEGID FROM CATEGORY_V1))
+            OR (t.PAYEEID NOT IN (-1, 0) AND t.PAYEEID NOT IN (SELECT PAYEEID FROM PAYEE_V1))
+        """
+    ).fetchall()
+    if orphans:
+        raise StagingValidationError(
+            f"Transactions referencing unknown accounts, categories or payees: {[row[0] for row in orphans]}"
+        )
+
+    invalid_splits: list = connection.execute(
+        """
+        SELECT
+            s.TRANSID
+        FROM
+            SPLITTRANSACTIONS_V1 s
+        LEFT JOIN CHECKINGACCOUNT_V1 t ON t.TRANSID = s.TRANSID
+        GROUP BY
+            s.TRANSID
+        HAVING
+            MAX(t.TRANSID IS NULL)
+            OR MAX(s.CATEGID IS NULL OR s.CATEGID NOT IN (SELECT CATEGID FROM CATEGORY_V1))
+            OR ABS(SUM(s.SPLITTRANSAMOUNT) - MAX(t.TRANSAMOUNT)) > ?
+        """,
+        (BALANCE_TOLERANCE,),
+    ).fetchall()
+    if invalid_splits:
+        raise StagingValidationError(
+            "Split transactions with unknown parents or categories, or not summing to the parent amount: "
+            f"{[row[0] for row in invalid_splits]}"
+        )
+
+
+def validate_balances(
+    connection: sqlite3.Connection, balances_before: dict[int, float], expected_deltas: dict[int, float]
+) -> None:
+    """Check that the account balances moved exactly by the amounts that were imported.
+
+    The expected deltas are computed from the same converted amounts that are inserted, so this check catches rows
+    that were lost, duplicated or attached to the wrong account by the insert, but not a wrong currency conversion or
+    a wrong conversion from ledger: those are caught by the reconciliation against the ledger balances.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        balances_before (dict[int, float]): The account balances computed before the import.
+        expected_deltas (dict[int, float]): The expected balance change of every account touched by the import.
+
+    Raises:
+        StagingValidationError: If at least one account balance does not match the expected one.
+
+    Returns:
+        None
+    """
+    balances_after: dict[int, float] = account_balances(connection)
+    mismatches: dict[int, tuple[float, float]] = {}
+
+    for account_id, balance in balances_after.items():
+        expected: float = balances_before.get(account_id, 0.0) + expected_deltas.get(account_id, 0.0)
+        if abs(balance - expected) > BALANCE_TOLERANCE:
+            mismatches[account_id] = (expected, balance)
+
+    if mismatches:
+        raise StagingValidationError(f"Account balances (expected, actual) do not match: {mismatches}")
+
+
+@contextlib.contextmanager
+def staging_database(path: str | pathlib.Path, dry_run: bool = False) -> Iterator[sqlite3.Connection]:
+    """Run a block of work against an in-memory copy of a MMEX database.
+
+    The database is loaded in memory, handed to the caller and, if the block completes without errors and changed
+    something, validated and written back to the original file in a single transaction. If anything fails, the file
+    is open in another application or it was modified by someone else in the meantime, the original file is left
+    untouched.
+
+    Args:
+        path (str | pathlib.Path): The path to the MMEX database.
+        dry_run (bool, optional): If True the staged database is validated but never written back. Defaults to False.
+
+    Yields:
+        sqlite3.Connection: A connection to the in-memory copy of the database.
+
+    Examples:
+        >>> with staging_database("finances.mmb") as connection:
+        ...     dataframe.to_sql("CHECKINGACCOUNT_V1", connection, if_exists="append", index=False)
+    """
+    connection, loaded_version = load_into_memory(path)
+    try:
+        yield connection
+        # A block that leaves nothing to commit did not change the database, the file is not rewritten
+        if not connection.in_transaction:
+            return
+        connection.commit()
+        validate_database(connection)
+        if not dry_run:
+            write_back(connection, path, loaded_version)
+    finally:
+        connection.close()
@@ -0,0 +1,160 @@
+import pathlib
+from typing import Self
+
+import numpy as np
+import pandas as pd
+
+DATE_PATTERN: str = r"\d{4}-\d{2}-\d{2}"
+REASON_SEPARATOR: str = "; "
+
+
+class ImportValidationError(Exception):
+    """Exception raised when converted transactions fail validation before being imported."""
+
+    def __init__(self: Self, message: str = "Converted transactions failed validation.") -> None:
+        """Initialize a custom exception with an optional error message.
+
+        Args:
+            message (str, optional): The error message. Defaults to "Converted transactions failed validation."
+
+        Examples:
+            >>> raise ImportValidationError("3 rejected rows written to data/2023_rejects.csv")
+            ImportValidationError: 3 rejected rows written to data/2023_rejects.csv
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+def full_categories(categories: pd.Series, sub_categories: pd.Series) -> pd.Series:
+    """Join the category and sub-category columns into the MMEX full category path.
+
+    Args:
+        categories (pd.Series): The categories.
+        sub_categories (pd.Series): The sub-categories, NaN or empty where there is none.
+
+    Returns:
+        pd.Series: The "Category:SubCategory" paths, or the category alone where there is no sub-category.
+    """
+    has_sub_category: pd.Series = sub_categories.notna() & (sub_categories.astype(str) != "")
+    return categories.where(~has_sub_category, categories + ":" + sub_categories.astype(str))
+
+
+def collect_reasons(checks: dict[str, pd.Series]) -> pd.Series:
+    """Combine boolean violation masks into one reason string per row.
+
+    Args:
+        checks (dict[str, pd.Series]): A dictionary mapping each reason to the mask of the rows violating it.
+
+    Returns:
+        pd.Series: The reasons of every row joined by "; ", "" for the valid rows.
+    """
+    index: pd.Index = next(iter(checks.values())).index
+    reasons: np.ndarray = np.full(len(index), "", dtype=object)
+    for reason, mask in checks.items():
+        reasons = reasons + np.where(mask.to_numpy(dtype=bool), reason + REASON_SEPARATOR, "")
+    return pd.Series(reasons, index=index, dtype=str).str.removesuffix(REASON_SEPARATOR)
+
+
+def validate_transactions(
+    transactions: pd.DataFrame, account_names: set[str], category_names: set[str]
+) -> pd.Series:
+    """Check a whole frame of converted transactions against the MMEX accounts and categories.
+
+    Args:
+        transactions (pd.DataFrame): The converted transactions, as written by data_preprocessing.
+        account_names (set[str]): The names of the MMEX accounts.
+        category_names (set[str]): The full paths of the MMEX categories.
+
+    Returns:
+        pd.Series: The violations of every row, "" for the valid rows.
+    """
+    is_transfer: pd.Series = transactions.Tipo == "Transfer"
+    # Split transactions have no category of their own, it is checked on their split rows
+    has_category: pd.Series = transactions.Categoria.notna() & (transactions.Categoria != "")
+    dates: pd.Series = transactions.Data.astype(str)
+
+    return collect_reasons(
+        {
+            "unknown account": ~transactions.Conto.isin(account_names),
+            "unknown destination account": is_transfer & ~transactions.ToConto.isin(account_names),
+            "destination account on a non transfer": ~is_transfer & transactions.ToConto.notna(),
+            "unknown category": has_category
+            & ~full_categories(transactions.Categoria, transactions["Sotto-Categoria"]).isin(category_names),
+            "invalid date": ~dates.str.fullmatch(DATE_PATTERN)
+            | pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce").isna(),
+            "zero or missing amount": transactions.Importo.fillna(0.0) == 0.0,
+        }
+    )
+
+
+def validate_splits(splits: pd.DataFrame, transaction_ids: set[int], category_names: set[str]) -> pd.Series:
+    """Check a whole frame of converted split rows.
+
+    Args:
+        splits (pd.DataFrame): The converted split rows, as written by data_preprocessing.
+        transaction_ids (set[int]): The ids of the converted transactions.
+        category_names (set[str]): The full paths of the MMEX categories.
+
+    Returns:
+        pd.Series: The violations of every row, "" for the valid rows.
+    """
+    return collect_reasons(
+        {
+            "unknown transaction": ~splits.Id.isin(transaction_ids),
+            "unknown category": ~full_categories(splits.Categoria, splits["Sotto-Categoria"]).isin(category_names),
+            "zero or missing amount": splits.Importo.fillna(0.0) == 0.0,
+        }
+    )
+
+
+def rejects_path(path: str | pathlib.Path) -> pathlib.Path:
+    """Compute the path of the rejects file of a converted file.
+
+    Args:
+        path (str | pathlib.Path): The path to the converted csv file.
+
+    Returns:
+        pathlib.Path: The path to the rejects csv file, next to the converted one.
+    """
+    path = pathlib.Path(path)
+    return path.with_name(f"{path.stem}_rejects{path.suffix}")
+
+
+def validate_converted_file(
+    transactions_path: pathlib.Path,
+    splits_file_path: pathlib.Path,
+    account_names: set[str],
+    category_names: set[str],
+) -> int:
+    """Validate a converted file and its split rows, writing the rejected rows and their reasons next to it.
+
+    Args:
+        transactions_path (pathlib.Path): The path to the converted transactions.
+        splits_file_path (pathlib.Path): The path to the converted split rows, which may not exist.
+        account_names (set[str]): The names of the MMEX accounts.
+        category_names (set[str]): The full paths of the MMEX categories.
+
+    Returns:
+        int: The number of rejected rows, 0 if the file can be imported.
+    """
+    transactions: pd.DataFrame = pd.read_csv(transactions_path)
+    reasons: pd.Series = validate_transactions(transactions, account_names, category_names)
+    rejected: pd.Series = reasons != ""
+    rejects: pd.DataFrame = transactions[rejected].assign(FILE=transactions_path.name, REASON=reasons[rejected])
+
+    if splits_file_path.exists():
+        splits: pd.DataFrame = pd.read_csv(splits_file_path)
+        split_reasons: pd.Series = validate_splits(splits, set(transactions.Id), category_names)
+        split_rejected: pd.Series = split_reasons != ""
+        split_rejects: pd.DataFrame = splits[split_rejected].assign(
+            FILE=splits_file_path.name, REASON=split_reasons[split_rejected]
+        )
+        rejects = pd.concat([rejects, split_rejects], ignore_index=True)
+
+    output_path: pathlib.Path = rejects_path(transactions_path)
+    if rejects.empty:
+        output_path.unlink(missing_ok=True)
+    else:
+        rejects.to_csv(output_path, index=False)
+
+    return len(rejects)
@@ -1,17 +1,28 @@
-import bisect
+import argparse
+import heapq
+import os
 import pathlib
 import sqlite3
 from datetime import datetime
+from typing import Iterator
 
 import pandas as pd
 import pytz
 
+from currency.fx_rates import FxRates
+from data_preprocessing import splits_path
+from mmex.lookup_cache import cached_query
+from mmex.payees import create_payees, resolve_payees
+from mmex.records import MmexTransaction, insert_transactions, iter_converted_transactions, tee_to_csv
+from mmex.staging import account_balances, staging_database, validate_balances
+from mmex.validation import ImportValidationError, full_categories, rejects_path, validate_converted_file
+
 MMEX_PATH: str = "/home/paolo/Nextcloud/MoneyManager/finances.mmb"
 DATETIME_FORMAT: str = "%Y-%m-%dT%H:%M:%S"
 
 
-def get_transactions_id() -> list[int]:
-    with sqlite3.connect(MMEX_PATH) as connection:
+def get_transactions_id(mmex_path: str | pathlib.Path = MMEX_PATH) -> list[int]:
+    with sqlite3.connect(mmex_path) as connection:
         cursor: sqlite3.Cursor = connection.cursor()
         results: list = cursor.execute(
             """
@@ -25,8 +36,8 @@ def get_transactions_id() -> list[int]:
     return sorted([trans_id[0] for trans_id in results])
 
 
-def get_column_names_table(table_name: str) -> list[str]:
-    with sqlite3.connect(MMEX_PATH) as connection:
+def get_column_names_table(table_name: str, mmex_path: str | pathlib.Path = MMEX_PATH) -> list[str]:
+    with sqlite3.connect(mmex_path) as connection:
         cursor: sqlite3.Cursor = connection.cursor()
         cursor = cursor.execute(
             f"""
@@ -41,55 +52,50 @@ def get_column_names_table(table_name: str) -> list[str]:
     return column_names
 
 
-def load_accounts() -> pd.DataFrame:
-    with sqlite3.connect(MMEX_PATH) as connection:
-        cursor: sqlite3.Cursor = connection.cursor()
-        results: list = cursor.execute(
-            """
-            SELECT
-                ACCOUNTID, ACCOUNTNAME
-            FROM
-                ACCOUNTLIST_V1
-            """
-        ).fetchall()
-
-        column_names: list[str] = [description[0] for description in cursor.description]
-
-    return pd.DataFrame(results, columns=column_names)
-
-
-def load_categories() -> pd.DataFrame:
-    with sqlite3.connect(MMEX_PATH) as connection:
-        cursor: sqlite3.Cursor = connection.cursor()
-        results: list = cursor.execute(
-            """
-            SELECT
-                CATEGID, CATEGNAME, PARENTID
-            FROM
-                CATEGORY_V1
-            """
-        ).fetchall()
-
-        column_names: list[str] = [description[0] for description in cursor.description]
-
-    return pd.DataFrame(results, columns=column_names)
+def load_accounts(
+    mmex_path: str | pathlib.Path = MMEX_PATH, cache_dir: str | pathlib.Path | None = None
+) -> pd.DataFrame:
+    return cached_query(
+        mmex_path,
+        """
+        SELECT
+            a.ACCOUNTID, a.ACCOUNTNAME, c.CURRENCY_SYMBOL
+        FROM
+            ACCOUNTLIST_V1 a
+        LEFT JOIN CURRENCYFORMATS_V1 c ON c.CURRENCYID = a.CURRENCYID
+        """,
+        cache_dir,
+    )
 
 
-def load_payee() -> pd.DataFrame:
-    with sqlite3.connect(MMEX_PATH) as connection:
-        cursor: sqlite3.Cursor = connection.cursor()
-        results: list = cursor.execute(
-            """
-            SELECT
-                PAYEEID, PAYEENAME
-            FROM
-                PAYEE_V1
-            """
-        ).fetchall()
+def load_categories(
+    mmex_path: str | pathlib.Path = MMEX_PATH, cache_dir: str | pathlib.Path | None = None
+) -> pd.DataFrame:
+    return cached_query(
+        mmex_path,
+        """
+        SELECT
+            CATEGID, CATEGNAME, PARENTID
+        FROM
+            CATEGORY_V1
+        """,
+        cache_dir,
+    )
 
-        column_names: list[str] = [description[0] for description in cursor.description]
 
-    return pd.DataFrame(results, columns=column_names)
+def load_payee(
+    mmex_path: str | pathlib.Path = MMEX_PATH, cache_dir: str | pathlib.Path | None = None
+) -> pd.DataFrame:
+    return cached_query(
+        mmex_path,
+        """
+        SELECT
+            PAYEEID, PAYEENAME
+        FROM
+            PAYEE_V1
+        """,
+        cache_dir,
+    )
 
 
 def load_transfers(path: str) -> pd.DataFrame:
@@ -112,77 +118,266 @@ def load_transfers(path: str) -> pd.DataFrame:
     return transfers
 
 
-def save_account_trasnfers_to_db(account_path: pathlib.Path) -> None:
-    tzinfo: pytz.timezone = pytz.timezone("Europe/Rome")
-    followup_id, color = -1, -1
-    transaction_number, deleted_time = "", ""
-    status: str = "R"
+def compute_balance_deltas(mmex_transfers_df: pd.DataFrame) -> dict[int, float]:
+    signs: pd.Series = mmex_transfers_df.TRANSCODE.map({"Deposit": 1.0}).fillna(-1.0)
+    outgoing: pd.Series = (signs * mmex_transfers_df.TRANSAMOUNT).groupby(mmex_transfers_df.ACCOUNTID).sum()
+    is_transfer: pd.Series = mmex_transfers_df.TRANSCODE == "Transfer"
+    transfers: pd.DataFrame = mmex_transfers_df.loc[is_transfer]
+    incoming: pd.Series = transfers.TOTRANSAMOUNT.groupby(transfers.TOACCOUNTID).sum()
+    return outgoing.add(incoming, fill_value=0.0).to_dict()
+
+
+def convert_to_account_currencies(
+    transfers: pd.DataFrame, accounts: pd.DataFrame, fx_rates: FxRates
+) -> pd.DataFrame:
+    account_currencies: pd.Series = accounts.set_index("ACCOUNTNAME").CURRENCY_SYMBOL
+    from_currencies: pd.Series = transfers.Conto.map(account_currencies).fillna(transfers.Valuta)
+    to_currencies: pd.Series = transfers.ToConto.map(account_currencies).fillna(from_currencies)
+
+    transfers["TRANSAMOUNT"] = fx_rates.convert(transfers.Importo, transfers.Valuta, from_currencies, transfers.Data)
+    # The destination amount recorded in the ledger wins, the rates only fill in the transfers that lack one
+    transfers["TOTRANSAMOUNT"] = fx_rates.convert(
+        transfers.ImportoA.fillna(transfers.Importo),
+        transfers.ValutaA.fillna(transfers.Valuta),
+        to_currencies,
+        transfers.Data,
+    )
+    transfers[["TRANSAMOUNT", "TOTRANSAMOUNT"]] = transfers[["TRANSAMOUNT", "TOTRANSAMOUNT"]].round(2)
 
-    transfers_list: list[list[str | float | int | None | datetime]] = []
+    missing_rates: pd.DataFrame = transfers[transfers[["TRANSAMOUNT", "TOTRANSAMOUNT"]].isna().any(axis=1)]
+    if not missing_rates.empty:
+        raise ValueError(f"Missing exchange rates for transactions: {missing_rates.Id.tolist()}")
 
-    transfers: pd.DataFrame = pd.read_csv(account_path)
+    return transfers
 
-    for _, row in transfers.iterrows():
-        categ_id: str = (
-            row.Categoria if pd.isna(row["Sotto-Categoria"]) else f"{row.Categoria}:{row['Sotto-Categoria']}"
-        )
-        categ_id: int = categories.loc[categ_id == categories.FULL_CATEGORY].CATEGID.to_numpy()[0]
-        from_conto: int = accounts.loc[row.Conto == accounts.ACCOUNTNAME].ACCOUNTID.to_numpy()[0]
-        transcode: str = row.Tipo
-
-        if row.Tipo == "Transfer":
-            print("a")
-
-        try:
-            to_conto: int = accounts.loc[row.ToConto == accounts.ACCOUNTNAME].ACCOUNTID.to_numpy()[0]
-        except:
-            to_conto: int = -1
-        try:
-            payee_id: int = payees.loc[row.Beneficiario == payees.PAYEENAME].PAYEEID.to_numpy()[0]
-        except:
-            payee_id: int = 2
-        note = row.Note
-        trans_date: str = row.Data
-        amount: float = row.Importo
-        update_time: str = datetime.now(tz=tzinfo).strftime(DATETIME_FORMAT)
-        transaction_id: int = get_transaction_id(transactions_id)
-        bisect.insort(a=transactions_id, x=transaction_id)
-        transfers_list.append(
-            [
-                transaction_id,
-                from_conto,
-                to_conto,
-                payee_id,
-                transcode,
-                amount,
-                status,
-                transaction_number,
-                note,
-                categ_id,
-                trans_date,
-                update_time,
-                deleted_time,
-                followup_id,
-                amount,
-                color,
-            ]
+
+def find_imported_transactions(transfers: pd.DataFrame, connection: sqlite3.Connection) -> pd.Series:
+    # A converted transaction is already in MMEX if a row has its date, account, type and amount, repeated
+    # transactions are matched occurrence by occurrence so that a second identical coffee is still imported
+    keys: list[str] = ["Data", "Conto", "Tipo", "TRANSAMOUNT"]
+    if transfers.empty:
+        return pd.Series(False, index=transfers.index)
+
+    existing: pd.DataFrame = pd.read_sql_query(
+        """
+        SELECT
+            SUBSTR(t.TRANSDATE, 1, 10) AS Data,
+            a.ACCOUNTNAME AS Conto,
+            t.TRANSCODE AS Tipo,
+            ROUND(t.TRANSAMOUNT, 2) AS TRANSAMOUNT
+        FROM
+            CHECKINGACCOUNT_V1 t
+        JOIN ACCOUNTLIST_V1 a ON a.ACCOUNTID = t.ACCOUNTID
+        WHERE
+            SUBSTR(t.TRANSDATE, 1, 10) BETWEEN ? AND ?
+        """,
+        connection,
+        params=(transfers.Data.min(), transfers.Data.max()),
+    )
+    existing_counts: pd.Series = existing.groupby(keys).size().rename("EXISTING")
+    occurrences: pd.Series = transfers.groupby(keys).cumcount()
+    return occurrences < transfers[keys].join(existing_counts, on=keys).EXISTING.fillna(0)
+
+
+def save_currency_history(connection: sqlite3.Connection, fx_rates: FxRates) -> None:
+    currency_ids: dict[str, int] = dict(
+        connection.execute("SELECT CURRENCY_SYMBOL, CURRENCYID FROM CURRENCYFORMATS_V1").fetchall()
+    )
+    history: pd.DataFrame = fx_rates.history()
+    history = history[history.CURRENCY.isin(currency_ids.keys())]
+
+    connection.executemany(
+        """
+        INSERT OR REPLACE INTO CURRENCYHISTORY_V1
+            (CURRENCYID, CURRDATE, CURRVALUE, CURRUPDTYPE)
+        VALUES
+            (?, ?, ?, 1)
+        """,
+        zip(history.CURRENCY.map(currency_ids).tolist(), history.DATE.tolist(), history.RATE.tolist()),
+    )
+
+
+def prepare_payees(
+    account_paths: list[pathlib.Path], connection: sqlite3.Connection, payees: pd.DataFrame
+) -> dict[str, int]:
+    if not account_paths:
+        return {}
+
+    names: pd.Series = (
+        pd.concat([pd.read_csv(path, usecols=["Beneficiario"]).Beneficiario for path in account_paths])
+        .dropna()
+        .drop_duplicates()
+    )
+    matched_ids: pd.Series = resolve_payees(names, payees)
+    payee_ids: dict[str, int] = dict(zip(names[matched_ids.notna()], matched_ids.dropna().astype(int)))
+
+    missing_names: list[str] = names[matched_ids.isna()].tolist()
+    if missing_names:
+        payee_ids.update(create_payees(connection, missing_names))
+        print(f"created {len(missing_names)} payees")
+
+    return payee_ids
+
+
+def build_mmex_transactions(
+    transfers: pd.DataFrame,
+    account_ids: dict[str, int],
+    category_ids: list[int],
+    payee_ids: dict[str, int],
+    transactions_id: list[int],
+    split_transaction_ids: dict[int, int],
+    update_time: str,
+) -> Iterator[MmexTransaction]:
+    # The ids of the whole file are allocated at once, and the shared list is updated for the next files
+    new_transaction_ids: list[int] = allocate_transaction_ids(transactions_id, len(transfers))
+    transactions_id[:] = list(heapq.merge(transactions_id, new_transaction_ids))
+
+    for transaction, transaction_id, amount, to_amount, categ_id in zip(
+        iter_converted_transactions(transfers),
+        new_transaction_ids,
+        transfers.TRANSAMOUNT.tolist(),
+        transfers.TOTRANSAMOUNT.tolist(),
+        category_ids,
+    ):
+        # Split transactions have no category, it is stored in their split rows
+        if categ_id == -1:
+            split_transaction_ids[transaction.id] = transaction_id
+
+        yield MmexTransaction(
+            TRANSID=transaction_id,
+            # The accounts were validated before the import, only non transfers have no destination account
+            ACCOUNTID=account_ids[transaction.account],
+            TOACCOUNTID=account_ids.get(transaction.to_account, -1),
+            PAYEEID=payee_ids.get(transaction.payee, -1),
+            TRANSCODE=transaction.type,
+            TRANSAMOUNT=amount,
+            STATUS="R",
+            TRANSACTIONNUMBER="",
+            NOTES=transaction.notes,
+            CATEGID=categ_id,
+            TRANSDATE=transaction.date,
+            LASTUPDATEDTIME=update_time,
+            DELETEDTIME="",
+            FOLLOWUPID=-1,
+            TOTRANSAMOUNT=to_amount,
+            COLOR=-1,
         )
 
-    mmex_transfers_df: pd.DataFrame = pd.DataFrame(transfers_list, columns=get_column_names_table("CHECKINGACCOUNT_V1"))
 
-    # year: int = int(account_path.name.split(".")[0])
-    mmex_transfers_df.to_csv(account_path.with_name(f"test_db_{account_path.name}"), index=False)
+def save_account_trasnfers_to_db(
+    account_path: pathlib.Path,
+    connection: sqlite3.Connection,
+    accounts: pd.DataFrame,
+    categories: pd.DataFrame,
+    payee_ids: dict[str, int],
+    transactions_id: list[int],
+    fx_rates: FxRates,
+    update_time: str,
+) -> dict[int, float]:
+    transfers: pd.DataFrame = pd.read_csv(account_path)
+    transfers = convert_to_account_currencies(transfers, accounts, fx_rates)
+    imported: pd.Series = find_imported_transactions(transfers, connection)
+    if imported.any():
+        print(f"skipping {imported.sum()} transactions already in the database")
+        transfers = transfers[~imported]
+
+    account_ids: dict[str, int] = dict(zip(accounts.ACCOUNTNAME.tolist(), accounts.ACCOUNTID.tolist()))
+    category_ids: pd.Series = categories.drop_duplicates("FULL_CATEGORY").set_index("FULL_CATEGORY").CATEGID
+    transfer_category_ids: list[int] = (
+        full_categories(transfers.Categoria, transfers["Sotto-Categoria"])
+        .map(category_ids)
+        .fillna(-1)
+        .astype(int)
+        .tolist()
+    )
+    split_transaction_ids: dict[int, int] = {}
+
+    # The records are written to the check file and inserted as they are built, without an intermediate frame
+    insert_transactions(
+        connection,
+        tee_to_csv(
+            build_mmex_transactions(
+                transfers,
+                account_ids,
+                transfer_category_ids,
+                payee_ids,
+                transactions_id,
+                split_transaction_ids,
+                update_time,
+            ),
+            account_path.with_name(f"test_db_{account_path.name}"),
+            MmexTransaction._fields,
+        ),
+    )
     print("data written to file")
-    with sqlite3.connect(MMEX_PATH) as conn:
-        mmex_transfers_df.to_sql("CHECKINGACCOUNT_V1", conn, if_exists="append", index=False)
-        print("data written to db")
+    save_splits_to_db(
+        splits_path(account_path),
+        connection,
+        categories,
+        split_transaction_ids,
+        (transfers.TRANSAMOUNT / transfers.Importo).set_axis(transfers.Id).to_dict(),
+    )
+    print("data written to staging db")
+
+    return compute_balance_deltas(
+        pd.DataFrame(
+            {
+                "ACCOUNTID": transfers.Conto.map(account_ids),
+                "TOACCOUNTID": transfers.ToConto.map(account_ids),
+                "TRANSCODE": transfers.Tipo,
+                "TRANSAMOUNT": transfers.TRANSAMOUNT,
+                "TOTRANSAMOUNT": transfers.TOTRANSAMOUNT,
+            }
+        )
+    )
 
 
-def get_transaction_id(transaction_ids: list[int]) -> int:
-    return next(
-        (idx for idx, trans_id in enumerate(transaction_ids) if idx != trans_id),
-        -1,
+def save_splits_to_db(
+    path: pathlib.Path,
+    connection: sqlite3.Connection,
+    categories: pd.DataFrame,
+    split_transaction_ids: dict[int, int],
+    conversion_factors: dict[int, float],
+) -> None:
+    if not path.exists():
+        return
+
+    splits: pd.DataFrame = pd.read_csv(path)
+    # The splits of the transactions that were skipped as already imported have no parent to attach to
+    splits = splits[splits.Id.isin(split_transaction_ids.keys())]
+    if splits.empty:
+        return
+
+    full_categories: pd.Series = splits.Categoria.where(
+        splits["Sotto-Categoria"].isna(), splits.Categoria + ":" + splits["Sotto-Categoria"]
     )
+    category_ids: pd.Series = categories.drop_duplicates("FULL_CATEGORY").set_index("FULL_CATEGORY").CATEGID
+    first_split_id: int = connection.execute(
+        "SELECT COALESCE(MAX(SPLITTRANSID), 0) + 1 FROM SPLITTRANSACTIONS_V1"
+    ).fetchone()[0]
+
+    mmex_splits_df: pd.DataFrame = pd.DataFrame(
+        {
+            "SPLITTRANSID": range(first_split_id, first_split_id + len(splits)),
+            "TRANSID": splits.Id.map(split_transaction_ids),
+            "CATEGID": full_categories.map(category_ids),
+            "SPLITTRANSAMOUNT": (splits.Importo * splits.Id.map(conversion_factors)).round(2),
+        }
+    )
+    mmex_splits_df.to_sql("SPLITTRANSACTIONS_V1", connection, if_exists="append", index=False)
+
+
+def allocate_transaction_ids(transaction_ids: list[int], count: int) -> list[int]:
+    # The gaps of the sorted ids are filled first, lowest id first, then the ids continue after the largest one
+    allocated: list[int] = []
+    candidate: int = 1
+    for used_id in transaction_ids:
+        if len(allocated) == count:
+            break
+        allocated.extend(range(candidate, min(used_id, candidate + count - len(allocated))))
+        candidate = max(candidate, used_id + 1)
+    allocated.extend(range(candidate, candidate + count - len(allocated)))
+    return allocated
 
 
 def preprocess_categories(categories: pd.DataFrame) -> pd.DataFrame:
@@ -204,14 +399,121 @@ def preprocess_categories(categories: pd.DataFrame) -> pd.DataFrame:
     return categories
 
 
-if __name__ == "__main__":
-    transactions_id: list[int] = get_transactions_id()
-    accounts: pd.DataFrame = load_accounts()
-    categories: pd.DataFrame = preprocess_categories(load_categories())
-    payees: pd.DataFrame = load_payee()
+def validate_converted_files(
+    account_paths: list[pathlib.Path], accounts: pd.DataFrame, categories: pd.DataFrame
+) -> None:
+    account_names: set[str] = set(accounts.ACCOUNTNAME)
+    category_names: set[str] = set(categories.FULL_CATEGORY)
+    rejected: dict[str, int] = {}
+
+    for account_path in account_paths:
+        rejected_rows: int = validate_converted_file(
+            account_path, splits_path(account_path), account_names, category_names
+        )
+        if rejected_rows:
+            rejected[str(rejects_path(account_path))] = rejected_rows
+
+    if rejected:
+        raise ImportValidationError(f"Rejected rows, see the reasons in the rejects files: {rejected}")
+
 
-    for account_path in sorted(pathlib.Path("/media/paolo/Kingston SSD/ledger-to-mmex/data").rglob("*[0-9]*.csv")):
-        save_account_trasnfers_to_db(account_path)
+def get_run_timestamp(
+    account_paths: list[pathlib.Path], reproducible: bool = False, latest_update_time: str = ""
+) -> str:
+    tzinfo: pytz.timezone = pytz.timezone("Europe/Rome")
+    if not reproducible:
+        return datetime.now(tz=tzinfo).strftime(DATETIME_FORMAT)
+
+    # Honour the reproducible builds convention, otherwise derive the time from the imported data only
+    source_date_epoch: str | None = os.environ.get("SOURCE_DATE_EPOCH")
+    if source_date_epoch:
+        timestamp: str = datetime.fromtimestamp(int(source_date_epoch), tz=tzinfo).strftime(DATETIME_FORMAT)
+    else:
+        last_dates: list[str] = [pd.read_csv(path, usecols=["Data"]).Data.dropna().max() for path in account_paths]
+        timestamp = f"{max(filter(pd.notna, last_dates), default='1970-01-01')}T00:00:00"
+
+    # A derived time can be in the future (a scheduled posting), it must not move the update times past the ones
+    # already seen, or the edits made in MMEX before it would never be exported by the sync
+    return min(timestamp, latest_update_time) if latest_update_time else timestamp
+
+
+def save_converted_files(
+    account_paths: list[pathlib.Path],
+    connection: sqlite3.Connection,
+    mmex_path: str | pathlib.Path,
+    fx_rates: FxRates,
+    reproducible: bool = False,
+    cache_dir: str | pathlib.Path | None = None,
+    latest_update_time: str = "",
+) -> None:
+    transactions_id: list[int] = get_transactions_id(mmex_path)
+    accounts: pd.DataFrame = load_accounts(mmex_path, cache_dir)
+    categories: pd.DataFrame = preprocess_categories(load_categories(mmex_path, cache_dir))
+    payees: pd.DataFrame = load_payee(mmex_path, cache_dir)
+    validate_converted_files(account_paths, accounts, categories)
+    # All the rows of a run share the same update time
+    update_time: str = get_run_timestamp(account_paths, reproducible, latest_update_time)
+
+    balances_before: dict[int, float] = account_balances(connection)
+    expected_deltas: dict[int, float] = {}
+    save_currency_history(connection, fx_rates)
+    payee_ids: dict[str, int] = prepare_payees(account_paths, connection, payees)
+
+    for account_path in account_paths:
+        deltas: dict[int, float] = save_account_trasnfers_to_db(
+            account_path, connection, accounts, categories, payee_ids, transactions_id, fx_rates, update_time
+        )
+        for account_id, delta in deltas.items():
+            expected_deltas[account_id] = expected_deltas.get(account_id, 0.0) + delta
+
+    validate_balances(connection, balances_before, expected_deltas)
+
+
+def import_converted_files(
+    account_paths: list[pathlib.Path],
+    mmex_path: str | pathlib.Path = MMEX_PATH,
+    dry_run: bool = False,
+    fx_rates_path: str | pathlib.Path | None = None,
+    reproducible: bool = False,
+    cache_dir: str | pathlib.Path | None = None,
+) -> None:
+    with staging_database(mmex_path, dry_run=dry_run) as staging_connection:
+        save_converted_files(
+            account_paths, staging_connection, mmex_path, FxRates.from_csv(fx_rates_path), reproducible, cache_dir
+        )
+
+    print("dry run completed, database left untouched" if dry_run else "data written to db")
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Import converted ledger files into MMEX.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="run the whole import on an in-memory copy of the database and never write it back",
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="stamp the rows with SOURCE_DATE_EPOCH or the last imported date instead of the current time",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=pathlib.Path.cwd() / ".cache" / "lookups",
+        help="directory of the lookup tables cache",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="always read the lookup tables from the database")
+    args: argparse.Namespace = parser.parse_args()
+
+    import_converted_files(
+        sorted(pathlib.Path("/media/paolo/Kingston SSD/ledger-to-mmex/data").rglob("[0-9][0-9][0-9][0-9].csv")),
+        MMEX_PATH,
+        dry_run=args.dry_run,
+        fx_rates_path="/media/paolo/Kingston SSD/ledger-to-mmex/data/fx_rates.csv",
+        reproducible=args.reproducible,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
 
     # try:
     #
@@ -0,0 +1,300 @@
+import asyncio
+import dataclasses
+import functools
+import hashlib
+import json
+import pathlib
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Literal, Self
+
+
+class PipelineError(Exception):
+    """Exception raised when the pipeline definition is not valid."""
+
+    def __init__(self: Self, message: str = "Invalid pipeline definition.") -> None:
+        """Initialize a custom exception with an optional error message.
+
+        Args:
+            message (str, optional): The error message. Defaults to "Invalid pipeline definition."
+
+        Examples:
+            >>> raise PipelineError("Unknown dependency 'convert'")
+            PipelineError: Unknown dependency 'convert'
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+@dataclasses.dataclass
+class Stage:
+    """Stage is a single step of the pipeline.
+
+    Attributes:
+        name (str): The unique name of the stage.
+        function (Callable[..., Any]): The callable executing the stage.
+        inputs (list[pathlib.Path]): The files read by the stage, used to decide whether the cached run is still valid.
+        outputs (list[pathlib.Path]): The files written by the stage, the cached run is valid only if they all exist.
+        dependencies (list[str]): The names of the stages that must complete before this one starts.
+        consumes (list[str]): The dependencies whose return value is passed to the function as a keyword argument,
+            they must not be cacheable since a skipped stage has no return value.
+        executor (Literal["thread", "process"]): The executor used to run the function, CPU bound stages should use
+            "process" so that they do not hold the GIL while the other stages run.
+        cacheable (bool): Whether the stage can be skipped when its inputs did not change since the last run.
+    """
+
+    name: str
+    function: Callable[..., Any]
+    inputs: list[pathlib.Path] = dataclasses.field(default_factory=list)
+    outputs: list[pathlib.Path] = dataclasses.field(default_factory=list)
+    dependencies: list[str] = dataclasses.field(default_factory=list)
+    consumes: list[str] = dataclasses.field(default_factory=list)
+    executor: Literal["thread", "process"] = "thread"
+    cacheable: bool = True
+
+
+class StageCache:
+    """StageCache stores the fingerprint of the inputs of every successfully completed stage.
+
+    Attributes:
+        path (pathlib.Path): The path to the json file holding the fingerprints.
+        fingerprints (dict[str, str]): A dictionary mapping each stage name to the fingerprint of its inputs.
+    """
+
+    def __init__(self: Self, path: str | pathlib.Path | None) -> None:
+        """Initialize a StageCache object, loading the fingerprints saved by the previous runs.
+
+        Args:
+            path (str | pathlib.Path | None): The path to the json cache file, None disables the cache.
+
+        Returns:
+            None
+        """
+        self.path: pathlib.Path | None = pathlib.Path(path) if path is not None else None
+        self.fingerprints: dict[str, str] = {}
+
+        if self.path is not None and self.path.exists():
+            with self.path.open("r") as file:
+                self.fingerprints = json.load(file)
+
+    @staticmethod
+    def fingerprint(stage: Stage) -> str:
+        """Compute the fingerprint of a stage from its function, its parameters and the content of its input files.
+
+        Args:
+            stage (Stage): The stage to fingerprint.
+
+        Returns:
+            str: The hex digest identifying the current content of the inputs.
+        """
+        digest = hashlib.sha256(stage.name.encode())
+        digest.update(_describe(stage.function).encode())
+        for path in sorted(stage.inputs):
+            digest.update(str(path).encode())
+            if not path.exists():
+                digest.update(b"missing")
+                continue
+            with path.open("rb") as file:
+                while chunk := file.read(1 << 20):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_fresh(self: Self, stage: Stage) -> bool:
+        """Check whether the stage was already run with the current inputs and its outputs still exist.
+
+        Args:
+            stage (Stage): The stage to check.
+
+        Returns:
+            bool: True if the stage can be skipped.
+        """
+        if self.path is None or not stage.cacheable:
+            return False
+
+        if not all(path.exists() for path in stage.outputs):
+            return False
+
+        return self.fingerprints.get(stage.name) == self.fingerprint(stage)
+
+    def store(self: Self, stage: Stage) -> None:
+        """Save the fingerprint of a completed stage.
+
+        Args:
+            stage (Stage): The completed stage.
+
+        Returns:
+            None
+        """
+        if self.path is None or not stage.cacheable:
+            return
+
+        self.fingerprints[stage.name] = self.fingerprint(stage)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w") as file:
+            json.dump(self.fingerprints, file, indent=4, sort_keys=True)
+
+
+class Pipeline:
+    """Pipeline runs a set of stages as a dependency graph, overlapping the stages that do not depend on each other.
+
+    Every stage starts as soon as all its dependencies completed, so the wall time of a run is the one of the critical
+    path of the graph instead of the sum of the stages.
+
+    Attributes:
+        stages (dict[str, Stage]): A dictionary mapping each stage name to the stage.
+        cache (StageCache): The cache used to skip the stages whose inputs did not change.
+        max_workers (int | None): The maximum number of workers of the thread and process executors.
+        results (dict[str, Any]): A dictionary mapping each completed stage name to its return value.
+    """
+
+    def __init__(self: Self, stages: list[Stage], cache: StageCache, max_workers: int | None = None) -> None:
+        """Initialize a Pipeline object and check that the dependency graph is valid.
+
+        Args:
+            stages (list[Stage]): The stages of the pipeline.
+            cache (StageCache): The cache used to skip the stages whose inputs did not change.
+            max_workers (int | None, optional): The maximum number of workers of each executor. Defaults to None.
+
+        Raises:
+            PipelineError: If two stages have the same name, a dependency is unknown or the graph has a cycle.
+
+        Returns:
+            None
+        """
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise PipelineError(f"Duplicated stage name '{stage.name}'")
+            self.stages[stage.name] = stage
+
+        self.cache: StageCache = cache
+        self.max_workers: int | None = max_workers
+        self.results: dict[str, Any] = {}
+        self._check_graph()
+
+    def _check_graph(self: Self) -> None:
+        """Check that every dependency exists and that the graph has no cycles.
+
+        Raises:
+            PipelineError: If a dependency is unknown, a consumed stage is cacheable or not a dependency, or the
+                graph has a cycle.
+
+        Returns:
+            None
+        """
+        visiting: set[str] = set()
+        visited: set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise PipelineError(f"Cycle detected at stage '{name}'")
+
+            visiting.add(name)
+            for consumed in self.stages[name].consumes:
+                if consumed not in self.stages[name].dependencies:
+                    raise PipelineError(f"Stage '{name}' consumes '{consumed}' without depending on it")
+                # A cached stage is skipped without a return value, so a stale consumer would receive None
+                if consumed in self.stages and self.stages[consumed].cacheable:
+                    raise PipelineError(f"Stage '{name}' consumes the cacheable stage '{consumed}'")
+            for dependency in self.stages[name].dependencies:
+                if dependency not in self.stages:
+                    raise PipelineError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def _run_stage(
+        self: Self, stage: Stage, tasks: dict[str, asyncio.Task], executors: dict[str, Executor]
+    ) -> Any:
+        """Wait for the dependencies of a stage and then run it in its executor, unless it is cached.
+
+        Args:
+            stage (Stage): The stage to run.
+            tasks (dict[str, asyncio.Task]): The tasks of all the stages of the pipeline.
+            executors (dict[str, Executor]): The executors available to the stages.
+
+        Returns:
+            Any: The value returned by the stage function, None if the stage was skipped.
+        """
+        await asyncio.gather(*(tasks[dependency] for dependency in stage.dependencies))
+
+        if self.cache.is_fresh(stage):
+            print(f"[{stage.name}] cached, skipping")
+            return None
+
+        kwargs: dict[str, Any] = {name: self.results[name] for name in stage.consumes}
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        start: float = time.perf_counter()
+        print(f"[{stage.name}] started")
+
+        result: Any = await loop.run_in_executor(executors[stage.executor], _call, stage.function, kwargs)
+
+        self.results[stage.name] = result
+        self.cache.store(stage)
+        print(f"[{stage.name}] completed in {time.perf_counter() - start:.2f}s")
+        return result
+
+    async def run_async(self: Self) -> dict[str, Any]:
+        """Run all the stages of the pipeline.
+
+        Returns:
+            dict[str, Any]: A dictionary mapping each completed stage name to its return value.
+        """
+        with (
+            ThreadPoolExecutor(max_workers=self.max_workers) as thread_executor,
+            ProcessPoolExecutor(max_workers=self.max_workers) as process_executor,
+        ):
+            executors: dict[str, Executor] = {"thread": thread_executor, "process": process_executor}
+            tasks: dict[str, asyncio.Task] = {}
+            for name in self.stages:
+                self.results.setdefault(name, None)
+            for name, stage in self.stages.items():
+                tasks[name] = asyncio.create_task(self._run_stage(stage, tasks, executors), name=name)
+            await asyncio.gather(*tasks.values())
+
+        return self.results
+
+    def run(self: Self) -> dict[str, Any]:
+        """Run all the stages of the pipeline in a new event loop.
+
+        Returns:
+            dict[str, Any]: A dictionary mapping each completed stage name to its return value.
+
+        Examples:
+            >>> pipeline = Pipeline([Stage("extract", extract), Stage("map", map_, dependencies=["extract"])], cache)
+            >>> pipeline.run()
+        """
+        return asyncio.run(self.run_async())
+
+
+def _describe(function: Callable[..., Any]) -> str:
+    """Describe a stage function and the arguments bound to it, so that changing a parameter invalidates the cache.
+
+    Args:
+        function (Callable[..., Any]): The function, usually a functools.partial.
+
+    Returns:
+        str: The qualified name of the function followed by the repr of its bound arguments.
+    """
+    if isinstance(function, functools.partial):
+        return f"{_describe(function.func)}({function.args!r}, {sorted(function.keywords.items())!r})"
+
+    return f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', type(function).__qualname__)}"
+
+
+def _call(function: Callable[..., Any], kwargs: dict[str, Any]) -> Any:
+    """Call a function with the given keyword arguments, used to submit stages to the executors.
+
+    Args:
+        function (Callable[..., Any]): The function to call.
+        kwargs (dict[str, Any]): The keyword arguments.
+
+    Returns:
+        Any: The value returned by the function.
+    """
+    return function(**kwargs)
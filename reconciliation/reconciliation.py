@@ -0,0 +1,258 @@
+import json
+import pathlib
+import sqlite3
+
+import pandas as pd
+
+from data_preprocessing import LedgerCols, build_account_metadata, load_ledger
+
+BALANCE_TOLERANCE: float = 0.005
+REPORT_COLUMNS: list[str] = [
+    "ACCOUNT",
+    "LEDGER_BALANCE",
+    "MMEX_BALANCE",
+    "DIFFERENCE",
+    "FIRST_DIVERGING_DATE",
+    "CHECKPOINT_DATE",
+]
+
+
+def load_checkpoints(path: str | pathlib.Path) -> dict[str, dict[str, str | float]]:
+    """Load the reconciliation checkpoints saved by the previous run.
+
+    Args:
+        path (str | pathlib.Path): The path to the json checkpoints file.
+
+    Returns:
+        dict[str, dict[str, str | float]]: A dictionary mapping each account name to the last date on which ledger and
+            MMEX agreed and to the two balances on that date.
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return {}
+
+    with path.open("r") as file:
+        return json.load(file)
+
+
+def save_checkpoints(path: str | pathlib.Path, checkpoints: dict[str, dict[str, str | float]]) -> None:
+    """Save the reconciliation checkpoints to a json file.
+
+    Args:
+        path (str | pathlib.Path): The path to the json checkpoints file.
+        checkpoints (dict[str, dict[str, str | float]]): The checkpoints to save.
+
+    Returns:
+        None
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as file:
+        json.dump(checkpoints, file, indent=4, sort_keys=True)
+
+
+def ledger_daily_flows(ledger: pd.DataFrame, checkpoints: dict[str, dict[str, str | float]]) -> pd.DataFrame:
+    """Sum the ledger postings of every Assets account by day, starting after the checkpoint of the account.
+
+    The postings already covered by a checkpoint are dropped before the aggregation, so that a run only sums the
+    days added since the previous one.
+
+    Args:
+        ledger (pd.DataFrame): The ledger postings, including the starting balances.
+        checkpoints (dict[str, dict[str, str | float]]): The checkpoints saved by the previous run.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the ACCOUNT, DATE and LEDGER (net daily flow) columns.
+    """
+    postings: pd.DataFrame = ledger[ledger[LedgerCols.CATEGORY].str.startswith("Assets:")]
+    account_codes, accounts = pd.factorize(postings[LedgerCols.CATEGORY])
+    account_names: pd.Series = pd.Series(
+        build_account_metadata(accounts, {}).NAME.to_numpy()[account_codes], index=postings.index, name="ACCOUNT"
+    )
+    dates: pd.Series = postings[LedgerCols.DATE].str.replace("/", "-").rename("DATE")
+
+    checkpoint_dates: dict[str, str] = {account: point["date"] for account, point in checkpoints.items()}
+    after_checkpoint: pd.Series = dates > account_names.map(checkpoint_dates).fillna("")
+
+    return (
+        postings.loc[after_checkpoint, LedgerCols.AMOUNT]
+        .groupby([account_names[after_checkpoint], dates[after_checkpoint]])
+        .sum()
+        .rename("LEDGER")
+        .reset_index()
+    )
+
+
+def mmex_initial_balances(connection: sqlite3.Connection) -> dict[str, float]:
+    """Read the initial balance of every MMEX account.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+
+    Returns:
+        dict[str, float]: A dictionary mapping each account name to its initial balance.
+    """
+    results: list = connection.execute("SELECT ACCOUNTNAME, INITIALBAL FROM ACCOUNTLIST_V1").fetchall()
+    return {name: balance for name, balance in results}
+
+
+def mmex_daily_flows(connection: sqlite3.Connection, since: str = "") -> pd.DataFrame:
+    """Sum the MMEX transactions of every account by day, aggregating them in SQL.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+        since (str, optional): Only the days strictly after this ISO date are read. Defaults to "" (all history).
+
+    Returns:
+        pd.DataFrame: A DataFrame with the ACCOUNT, DATE and MMEX (net daily flow) columns.
+    """
+    return pd.read_sql_query(
+        """
+        SELECT
+            a.ACCOUNTNAME AS ACCOUNT,
+            m.DATE AS DATE,
+            SUM(m.AMOUNT) AS MMEX
+        FROM (
+            SELECT
+                ACCOUNTID,
+                SUBSTR(TRANSDATE, 1, 10) AS DATE,
+                CASE TRANSCODE WHEN 'Deposit' THEN TRANSAMOUNT ELSE -TRANSAMOUNT END AS AMOUNT
+            FROM
+                CHECKINGACCOUNT_V1
+            WHERE
+                STATUS != 'V' AND COALESCE(DELETEDTIME, '') = ''
+            UNION ALL
+            SELECT
+                TOACCOUNTID,
+                SUBSTR(TRANSDATE, 1, 10),
+                TOTRANSAMOUNT
+            FROM
+                CHECKINGACCOUNT_V1
+            WHERE
+                TRANSCODE = 'Transfer' AND STATUS != 'V' AND COALESCE(DELETEDTIME, '') = ''
+        ) m
+        JOIN ACCOUNTLIST_V1 a ON a.ACCOUNTID = m.ACCOUNTID
+        WHERE
+            m.DATE > ?
+        GROUP BY
+            a.ACCOUNTNAME, m.DATE
+        """,
+        connection,
+        params=(since,),
+    )
+
+
+def reconcile_flows(
+    ledger_flows: pd.DataFrame,
+    mmex_flows: pd.DataFrame,
+    initial_balances: dict[str, float],
+    checkpoints: dict[str, dict[str, str | float]],
+) -> tuple[pd.DataFrame, dict[str, dict[str, str | float]]]:
+    """Compare the running balances of ledger and MMEX starting from the checkpoints.
+
+    The daily flows of both sides are aligned on (account, date), accumulated with a per-account cumulative sum and
+    compared in a single vectorized pass. Every account of either side also gets a zero flow on the last date of the
+    run, so that the accounts without new flows (an idle MMEX account, for instance) are still compared, reported and
+    checkpointed.
+
+    Args:
+        ledger_flows (pd.DataFrame): The ledger daily flows after the checkpoints, as returned by ledger_daily_flows.
+        mmex_flows (pd.DataFrame): The MMEX daily flows, as returned by mmex_daily_flows.
+        initial_balances (dict[str, float]): The MMEX initial balance of every account.
+        checkpoints (dict[str, dict[str, str | float]]): The checkpoints saved by the previous run.
+
+    Returns:
+        tuple[pd.DataFrame, dict[str, dict[str, str | float]]]: The reconciliation report, one row per account, and
+            the updated checkpoints.
+    """
+    checkpoint_dates: dict[str, str] = {account: point["date"] for account, point in checkpoints.items()}
+    ledger_start: dict[str, float] = {account: point["ledger"] for account, point in checkpoints.items()}
+    mmex_start: dict[str, float] = {
+        **initial_balances,
+        **{account: point["mmex"] for account, point in checkpoints.items()},
+    }
+
+    # Drop the days already covered by the checkpoint of their account
+    ledger_flows = ledger_flows[ledger_flows.DATE > ledger_flows.ACCOUNT.map(checkpoint_dates).fillna("")]
+    mmex_flows = mmex_flows[mmex_flows.DATE > mmex_flows.ACCOUNT.map(checkpoint_dates).fillna("")]
+
+    accounts: list[str] = sorted(
+        set(initial_balances) | set(checkpoints) | set(ledger_flows.ACCOUNT) | set(mmex_flows.ACCOUNT)
+    )
+    last_date: str = max([*ledger_flows.DATE, *mmex_flows.DATE, *checkpoint_dates.values()], default="")
+    seeds: pd.DataFrame = pd.DataFrame({"ACCOUNT": accounts, "DATE": last_date, "LEDGER": 0.0, "MMEX": 0.0})
+
+    flows: pd.DataFrame = (
+        pd.concat([ledger_flows.merge(mmex_flows, on=["ACCOUNT", "DATE"], how="outer"), seeds], ignore_index=True)
+        .fillna({"LEDGER": 0.0, "MMEX": 0.0})
+        .groupby(["ACCOUNT", "DATE"], as_index=False)[["LEDGER", "MMEX"]]
+        .sum()
+    )
+    by_account = flows.groupby("ACCOUNT", sort=False)
+    flows["LEDGER_BALANCE"] = by_account.LEDGER.cumsum() + flows.ACCOUNT.map(ledger_start).fillna(0.0)
+    flows["MMEX_BALANCE"] = by_account.MMEX.cumsum() + flows.ACCOUNT.map(mmex_start).fillna(0.0)
+    flows["DIFFERENCE"] = flows.LEDGER_BALANCE - flows.MMEX_BALANCE
+    flows["DIVERGING"] = flows.DIFFERENCE.abs() > BALANCE_TOLERANCE
+
+    first_diverging_dates: pd.Series = flows[flows.DIVERGING].groupby("ACCOUNT").DATE.first()
+    before_divergence: pd.Series = flows.DATE < flows.ACCOUNT.map(first_diverging_dates).fillna("9999-12-31")
+    agreeing: pd.DataFrame = flows[before_divergence & ~flows.DIVERGING].groupby("ACCOUNT").last()
+
+    updated_checkpoints: dict[str, dict[str, str | float]] = dict(checkpoints)
+    for account, row in agreeing.iterrows():
+        updated_checkpoints[account] = {"date": row.DATE, "ledger": row.LEDGER_BALANCE, "mmex": row.MMEX_BALANCE}
+
+    report: pd.DataFrame = flows.groupby("ACCOUNT").last()[["LEDGER_BALANCE", "MMEX_BALANCE", "DIFFERENCE"]]
+    report["FIRST_DIVERGING_DATE"] = first_diverging_dates
+    report["CHECKPOINT_DATE"] = pd.Series({account: point["date"] for account, point in updated_checkpoints.items()})
+    report = report.rename_axis("ACCOUNT").reset_index()
+
+    return report[REPORT_COLUMNS].sort_values("ACCOUNT", ignore_index=True), updated_checkpoints
+
+
+def reconcile(
+    ledger_paths: list[pathlib.Path],
+    mmex_path: str | pathlib.Path,
+    checkpoint_path: str | pathlib.Path,
+    report_path: str | pathlib.Path,
+) -> pd.DataFrame:
+    """Reconcile the balances of the ledger files with the ones of the MMEX database and save the report.
+
+    The ledger files must cover the whole history of the accounts, starting balances included. Only the days after
+    the checkpoint of every account are summed, the checkpoints are then moved to the last day on which both sides
+    agree, so that a divergence keeps being reported until it is fixed.
+
+    Args:
+        ledger_paths (list[pathlib.Path]): The paths to the ledger csv reports.
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        checkpoint_path (str | pathlib.Path): The path to the json checkpoints file.
+        report_path (str | pathlib.Path): The path to the csv report.
+
+    Returns:
+        pd.DataFrame: The reconciliation report, one row per account.
+
+    Examples:
+        >>> reconcile([pathlib.Path("2023.csv")], "finances.mmb", "checkpoints.json", "reconciliation.csv")
+    """
+    checkpoints: dict[str, dict[str, str | float]] = load_checkpoints(checkpoint_path)
+    ledger: pd.DataFrame = pd.concat(
+        [load_ledger(path, keep_starting_balances=True) for path in ledger_paths], ignore_index=True
+    )
+
+    with sqlite3.connect(mmex_path) as connection:
+        initial_balances: dict[str, float] = mmex_initial_balances(connection)
+        since: str = min(point["date"] for point in checkpoints.values()) if checkpoints else ""
+        if initial_balances.keys() - checkpoints.keys():
+            since = ""
+        mmex_flows: pd.DataFrame = mmex_daily_flows(connection, since)
+
+    report, updated_checkpoints = reconcile_flows(
+        ledger_daily_flows(ledger, checkpoints), mmex_flows, initial_balances, checkpoints
+    )
+
+    report_path = pathlib.Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+    save_checkpoints(checkpoint_path, updated_checkpoints)
+
+    return report
@@ -0,0 +1,313 @@
+import argparse
+import collections
+import hashlib
+import json
+import pathlib
+import sqlite3
+
+import pandas as pd
+
+from currency.fx_rates import FxRates
+from data_preprocessing import (
+    LedgerCols,
+    assign_transaction_ids,
+    convert_ledger,
+    load_ledger,
+    load_mapped_categories,
+    save_unsupported_postings,
+    splits_path,
+)
+from mmex.ledger_exporter import export_transactions
+from mmex.staging import staging_database
+from notebooks.transfer_import import save_converted_files
+
+FINGERPRINT_COLUMNS: list[str] = [
+    LedgerCols.DATE,
+    LedgerCols.DESCRIPTION,
+    LedgerCols.CATEGORY,
+    LedgerCols.CURRENCY,
+    LedgerCols.AMOUNT,
+]
+
+
+def load_sync_state(path: str | pathlib.Path) -> dict:
+    """Load the high-water marks saved by the previous sync.
+
+    Args:
+        path (str | pathlib.Path): The path to the json state file.
+
+    Returns:
+        dict: A dictionary with the ledger mark (the date of the last synced posting and how many transactions of
+            every fingerprint were synced on that date) and the MMEX mark (the last LASTUPDATEDTIME seen).
+
+    Raises:
+        FileNotFoundError: If there is no state file, since syncing from empty marks would import the whole ledger
+            history and export the whole MMEX one.
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No sync state at {path}: run with --init first to mark the current ledger and MMEX data as synced"
+        )
+
+    with path.open("r") as file:
+        return json.load(file)
+
+
+def save_sync_state(path: str | pathlib.Path, state: dict) -> None:
+    """Save the high-water marks to a json file.
+
+    Args:
+        path (str | pathlib.Path): The path to the json state file.
+        state (dict): The state to save.
+
+    Returns:
+        None
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as file:
+        json.dump(state, file, indent=4, sort_keys=True)
+
+
+def fingerprint_transactions(ledger: pd.DataFrame, transaction_ids: pd.Series) -> pd.Series:
+    """Compute a fingerprint of every ledger transaction from the content of its postings.
+
+    Args:
+        ledger (pd.DataFrame): The ledger postings.
+        transaction_ids (pd.Series): The transaction id of every posting, as returned by assign_transaction_ids.
+
+    Returns:
+        pd.Series: The sha256 fingerprint of every posting's transaction, aligned with the postings.
+    """
+    if ledger.empty:
+        return pd.Series(dtype=object, index=transaction_ids.index)
+
+    postings: pd.Series = ledger[FINGERPRINT_COLUMNS].astype(str).agg("\x1f".join, axis=1)
+    fingerprints: pd.Series = (
+        postings.groupby(transaction_ids)
+        .agg("\x1e".join)
+        .map(lambda content: hashlib.sha256(content.encode()).hexdigest())
+    )
+    return transaction_ids.map(fingerprints)
+
+
+def ledger_delta(ledger: pd.DataFrame, mark: dict) -> tuple[pd.DataFrame, dict]:
+    """Select the ledger postings that are newer than the high-water mark.
+
+    The postings are grouped into transactions first, so that a transaction is always either entirely synced or
+    entirely new. Only the postings from the mark date onwards are fingerprinted: the ones after it are all new, the
+    ones on it are new only if their transaction was not synced yet. Identical transactions share a fingerprint, so
+    the mark counts them and they are matched occurrence by occurrence, as the importer does: a second identical
+    coffee added later on the mark date is still new.
+
+    Args:
+        ledger (pd.DataFrame): The ledger postings, as returned by load_ledger.
+        mark (dict): The ledger high-water mark, with the ISO date and the number of transactions synced on that date
+            for every fingerprint.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: The new postings and the updated mark.
+    """
+    ledger = ledger.sort_values(by=LedgerCols.DATE, kind="stable", ignore_index=True)
+    dates: pd.Series = ledger[LedgerCols.DATE].str.replace("/", "-")
+    transaction_ids: pd.Series = assign_transaction_ids(ledger)
+
+    candidates: pd.Series = dates >= mark["date"]
+    candidate_ids: pd.Series = transaction_ids[candidates]
+    fingerprints: pd.Series = fingerprint_transactions(ledger[candidates], candidate_ids)
+    transaction_fingerprints: pd.Series = fingerprints.groupby(candidate_ids).first()
+    transaction_dates: pd.Series = dates[candidates].groupby(candidate_ids).first()
+
+    # The states saved before the counts were introduced list every fingerprint once
+    synced_counts: collections.Counter = collections.Counter(mark["fingerprints"])
+    on_mark: pd.Series = transaction_fingerprints[transaction_dates == mark["date"]]
+    occurrences: pd.Series = on_mark.groupby(on_mark).cumcount()
+    synced: pd.Index = occurrences.index[occurrences < on_mark.map(synced_counts).fillna(0)]
+    new_postings: pd.DataFrame = ledger[candidates][~candidate_ids.isin(synced)]
+
+    if new_postings.empty:
+        return new_postings, mark
+
+    last_date: str = dates[new_postings.index].max()
+    last_counts: collections.Counter = collections.Counter(transaction_fingerprints[transaction_dates == last_date])
+    if last_date == mark["date"]:
+        last_counts |= synced_counts
+
+    return new_postings, {"date": last_date, "fingerprints": dict(sorted(last_counts.items()))}
+
+
+def mmex_last_updated(connection: sqlite3.Connection) -> str:
+    """Read the most recent LASTUPDATEDTIME of the MMEX transactions.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the MMEX database.
+
+    Returns:
+        str: The most recent update timestamp, "" if there are no transactions.
+    """
+    return connection.execute("SELECT COALESCE(MAX(LASTUPDATEDTIME), '') FROM CHECKINGACCOUNT_V1").fetchone()[0]
+
+
+def initialize_sync_state(
+    ledger_paths: list[pathlib.Path], mmex_path: str | pathlib.Path, state_path: str | pathlib.Path
+) -> dict:
+    """Mark everything currently in the ledger and in MMEX as synced, without importing or exporting anything.
+
+    Meant for the first sync of data that is already in both places, for example after a full import.
+
+    Args:
+        ledger_paths (list[pathlib.Path]): The paths to the ledger csv reports.
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        state_path (str | pathlib.Path): The path to the json state file.
+
+    Returns:
+        dict: The saved state.
+
+    Examples:
+        >>> initialize_sync_state([pathlib.Path("2024.csv")], "finances.mmb", ".cache/sync_state.json")
+    """
+    ledger: pd.DataFrame = pd.concat([load_ledger(path) for path in ledger_paths], ignore_index=True)
+    _, ledger_mark = ledger_delta(ledger, {"date": "", "fingerprints": {}})
+
+    with sqlite3.connect(f"file:{pathlib.Path(mmex_path)}?mode=ro", uri=True) as connection:
+        mmex_mark: dict = {"last_updated": mmex_last_updated(connection)}
+    connection.close()
+
+    state: dict = {"ledger": ledger_mark, "mmex": mmex_mark}
+    save_sync_state(state_path, state)
+    return state
+
+
+def delta_sync(
+    ledger_paths: list[pathlib.Path],
+    mmex_path: str | pathlib.Path,
+    data_dir: str | pathlib.Path,
+    state_path: str | pathlib.Path,
+    fx_rates_path: str | pathlib.Path | None = None,
+    dry_run: bool = False,
+    reproducible: bool = False,
+    cache_dir: str | pathlib.Path | None = None,
+) -> tuple[int, int]:
+    """Sync only what changed on both sides since the previous run.
+
+    The ledger postings newer than the ledger mark are converted and imported into MMEX, while the MMEX transactions
+    updated after the MMEX mark are exported to a ledger journal (data_dir/mmex_delta.ledger) to be merged by hand.
+    Both sides are read and written on the same staged copy of the database, so the whole sync is applied in a
+    single transaction and the MMEX mark already covers the transactions imported by this run. The marks are saved
+    only once the database has been written back.
+
+    The exported transactions come back as new ledger postings once they are merged, so the import skips the
+    converted rows that MMEX already has (same date, account, type and amount, see find_imported_transactions):
+    merging an export never duplicates it.
+
+    Edits to postings that were already synced are not propagated: an edited ledger transaction gets a new
+    fingerprint and is imported again only if it is on or after the ledger mark date.
+
+    Args:
+        ledger_paths (list[pathlib.Path]): The paths to the ledger csv reports.
+        mmex_path (str | pathlib.Path): The path to the MMEX database.
+        data_dir (str | pathlib.Path): The directory of the mapped categories and of the delta files.
+        state_path (str | pathlib.Path): The path to the json state file, created by initialize_sync_state.
+        fx_rates_path (str | pathlib.Path | None, optional): The path to the exchange rates csv file. Defaults to None.
+        dry_run (bool, optional): If True the database is never written back and the marks are not moved.
+            Defaults to False.
+        reproducible (bool, optional): If True the imported rows are stamped with a time derived from the data
+            instead of the current time, capped at the MMEX mark so that future-dated postings cannot move it.
+            Defaults to False.
+        cache_dir (str | pathlib.Path | None, optional): The directory of the lookup cache, None to always read the
+            lookup tables from the database. Defaults to None.
+
+    Returns:
+        tuple[int, int]: The number of ledger transactions imported and of MMEX transactions exported.
+
+    Examples:
+        >>> delta_sync([pathlib.Path("2024.csv")], "finances.mmb", "data", ".cache/sync_state.json")
+    """
+    data_dir = pathlib.Path(data_dir)
+    state: dict = load_sync_state(state_path)
+    mapped_categories: dict[str, str] = load_mapped_categories(data_dir / "mapped_categories.json")
+    fx_rates: FxRates = FxRates.from_csv(fx_rates_path)
+
+    ledger: pd.DataFrame = pd.concat([load_ledger(path) for path in ledger_paths], ignore_index=True)
+    new_postings, ledger_mark = ledger_delta(ledger, state["ledger"])
+
+    delta_path: pathlib.Path = data_dir / "ledger_delta.csv"
+    if not new_postings.empty:
+        # Whole days are converted, so that the importer matches identical transactions occurrence by occurrence
+        # against all the ones of their day: the already synced ones are found in MMEX, the new ones are not
+        touched_days: pd.DataFrame = ledger[ledger[LedgerCols.DATE].isin(new_postings[LedgerCols.DATE])]
+        transactions, splits, unsupported_postings = convert_ledger(touched_days, mapped_categories, fx_rates)
+        transactions.to_csv(delta_path, index=False)
+        splits.to_csv(splits_path(delta_path), index=False)
+        save_unsupported_postings(unsupported_postings, delta_path)
+
+    with staging_database(mmex_path, dry_run=dry_run) as connection:
+        with (data_dir / "mmex_delta.ledger").open("w") as output:
+            exported: int = export_transactions(
+                connection, output, mapped_categories, updated_since=state["mmex"]["last_updated"]
+            )
+
+        rows_before: int = connection.execute("SELECT COUNT(*) FROM CHECKINGACCOUNT_V1").fetchone()[0]
+        if not new_postings.empty:
+            save_converted_files(
+                [delta_path],
+                connection,
+                mmex_path,
+                fx_rates,
+                reproducible,
+                cache_dir,
+                latest_update_time=state["mmex"]["last_updated"],
+            )
+        imported: int = connection.execute("SELECT COUNT(*) FROM CHECKINGACCOUNT_V1").fetchone()[0] - rows_before
+        # Without new transactions the bookkeeping writes (rates, payees) are dropped and the file is not rewritten
+        if not imported:
+            connection.rollback()
+        mmex_mark: dict = {"last_updated": mmex_last_updated(connection)}
+
+    if not dry_run:
+        save_sync_state(state_path, {"ledger": ledger_mark, "mmex": mmex_mark})
+
+    return imported, exported
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Sync the ledger and MMEX changes made since the previous sync."
+    )
+    parser.add_argument("ledger_paths", type=pathlib.Path, nargs="+")
+    parser.add_argument("--mmex-path", type=pathlib.Path, required=True)
+    parser.add_argument("--data-dir", type=pathlib.Path, default=pathlib.Path.cwd() / "data")
+    parser.add_argument("--state-path", type=pathlib.Path, default=pathlib.Path.cwd() / ".cache" / "sync_state.json")
+    parser.add_argument("--init", action="store_true", help="mark the current data as synced without syncing it")
+    parser.add_argument("--fx-rates", type=pathlib.Path, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="sync on an in-memory copy and keep the marks")
+    parser.add_argument("--reproducible", action="store_true", help="stamp the imported rows with a data derived time")
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=pathlib.Path.cwd() / ".cache" / "lookups",
+        help="directory of the lookup tables cache",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="always read the lookup tables from the database")
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.init:
+        initialize_sync_state(args.ledger_paths, args.mmex_path, args.state_path)
+        print(f"sync state initialized at {args.state_path}")
+        parser.exit()
+
+    try:
+        imported, exported = delta_sync(
+            args.ledger_paths,
+            args.mmex_path,
+            args.data_dir,
+            args.state_path,
+            args.fx_rates,
+            args.dry_run,
+            args.reproducible,
+            None if args.no_cache else args.cache_dir,
+        )
+    except FileNotFoundError as error:
+        parser.error(str(error))
+    print(f"{imported} ledger transactions imported, {exported} MMEX transactions exported")
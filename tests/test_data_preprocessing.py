@@ -0,0 +1,147 @@
+import pandas as pd
+import pytest
+
+from data_preprocessing import LedgerCols, convert_ledger
+
+MAPPED_CATEGORIES: dict[str, str] = {
+    "Spese:Cibo:Cena": "Cibo:Mangiare fuori:Cena",
+    "Spese:Altro": "Altre Uscite",
+}
+
+
+def make_ledger(postings: list[tuple[str, str, str, float]]) -> pd.DataFrame:
+    ledger: pd.DataFrame = pd.DataFrame(
+        postings, columns=[LedgerCols.DATE, LedgerCols.DESCRIPTION, LedgerCols.CATEGORY, LedgerCols.AMOUNT]
+    )
+    ledger[LedgerCols.CURRENCY] = "€"
+    ledger["AMOUNT_NORM"] = ledger[LedgerCols.AMOUNT].abs()
+    return ledger
+
+
+def test_withdrawal_with_one_paying_account_is_converted() -> None:
+    transactions, splits, _ = convert_ledger(
+        make_ledger(
+            [
+                ("2023/01/06", "Cena", "Spese:Cibo:Cena", 30.0),
+                ("2023/01/06", "Cena", "Assets:Intesa XME", -30.0),
+            ]
+        ),
+        MAPPED_CATEGORIES,
+    )
+
+    assert transactions[["Tipo", "Conto", "Importo"]].to_numpy().tolist() == [["Withdrawal", "Intesa", 30.0]]
+    assert splits.empty
+
+
+def test_withdrawal_paid_from_two_accounts_is_set_aside() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Cena mista", "Assets:Contanti", -10.0),
+            ("2023/01/06", "Cena mista", "Assets:Intesa XME", -20.0),
+            ("2023/01/06", "Cena mista", "Spese:Cibo:Cena", 30.0),
+            ("2023/01/07", "Cena", "Spese:Cibo:Cena", 25.0),
+            ("2023/01/07", "Cena", "Assets:Intesa XME", -25.0),
+        ]
+    )
+
+    transactions, _, unsupported = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions[["Data", "Importo"]].to_numpy().tolist() == [["2023-01-07", 25.0]]
+    assert unsupported[LedgerCols.DESCRIPTION].tolist() == ["Cena mista"] * 3
+    assert set(unsupported.REASON) == {"paid from or to more than one account"}
+
+
+def test_transfer_with_fee_is_set_aside() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Bonifico con commissione", "Assets:Contanti", 99.0),
+            ("2023/01/06", "Bonifico con commissione", "Spese:Altro", 1.0),
+            ("2023/01/06", "Bonifico con commissione", "Assets:Intesa XME", -100.0),
+        ]
+    )
+
+    transactions, splits, unsupported = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions.empty and splits.empty
+    assert unsupported[LedgerCols.DESCRIPTION].tolist() == ["Bonifico con commissione"] * 3
+    assert set(unsupported.REASON) == {"paid from or to more than one account"}
+
+
+def test_transfer_between_three_accounts_is_set_aside() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Giroconto", "Assets:Contanti", 50.0),
+            ("2023/01/06", "Giroconto", "Assets:Revolut", 50.0),
+            ("2023/01/06", "Giroconto", "Assets:Intesa XME", -100.0),
+            ("2023/01/07", "Prelievo", "Assets:Contanti", 50.0),
+            ("2023/01/07", "Prelievo", "Assets:Intesa XME", -50.0),
+        ]
+    )
+
+    transactions, _, unsupported = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions[["Tipo", "Conto", "ToConto"]].to_numpy().tolist() == [["Transfer", "Intesa", "Contanti"]]
+    assert set(unsupported.REASON) == {"transfer with more than two postings"}
+
+
+def test_transfer_keeps_the_amount_and_commodity_received() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Ricarica", "Assets:Revolut", 100.0),
+            ("2023/01/06", "Ricarica", "Assets:Intesa XME", -90.0),
+        ]
+    )
+    ledger.loc[0, LedgerCols.CURRENCY] = "$"
+
+    transactions, _, _ = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions[["Importo", "Valuta", "ImportoA", "ValutaA"]].to_numpy().tolist() == [
+        [90.0, "EUR", 100.0, "USD"]
+    ]
+
+
+def test_payee_is_extracted_only_before_the_separator() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Pizzeria Da Gino | cena con amici", "Spese:Cibo:Cena", 30.0),
+            ("2023/01/06", "Pizzeria Da Gino | cena con amici", "Assets:Intesa XME", -30.0),
+            ("2023/01/07", "Regalo compleanno", "Spese:Altro", 20.0),
+            ("2023/01/07", "Regalo compleanno", "Assets:Intesa XME", -20.0),
+        ]
+    )
+
+    transactions, _, _ = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions.Beneficiario.tolist()[0] == "Pizzeria Da Gino"
+    assert pd.isna(transactions.Beneficiario.tolist()[1])
+
+
+def test_withdrawal_keeps_the_amount_moved_by_the_account() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Amazon US", "Spese:Altro", 10.0),
+            ("2023/01/06", "Amazon US", "Assets:Revolut", -11.37),
+        ]
+    )
+    ledger.loc[1, LedgerCols.CURRENCY] = "$"
+
+    # No exchange rates are loaded, the ledger already says how much each side moved
+    transactions, _, _ = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions[["Importo", "Valuta"]].to_numpy().tolist() == [[11.37, "USD"]]
+
+
+def test_split_amounts_are_scaled_to_the_amount_moved_by_the_account() -> None:
+    ledger: pd.DataFrame = make_ledger(
+        [
+            ("2023/01/06", "Amazon US", "Spese:Cibo:Cena", 30.0),
+            ("2023/01/06", "Amazon US", "Spese:Altro", 10.0),
+            ("2023/01/06", "Amazon US", "Assets:Revolut", -44.0),
+        ]
+    )
+    ledger.loc[2, LedgerCols.CURRENCY] = "$"
+
+    transactions, splits, _ = convert_ledger(ledger, MAPPED_CATEGORIES)
+
+    assert transactions[["Importo", "Valuta"]].to_numpy().tolist() == [[44.0, "USD"]]
+    assert splits.Importo.tolist() == pytest.approx([33.0, 11.0])
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from data_preprocessing import LedgerCols
+from sync.delta_sync import ledger_delta
+
+
+def make_ledger(postings: list[tuple[str, str, str, float]]) -> pd.DataFrame:
+    ledger: pd.DataFrame = pd.DataFrame(
+        postings, columns=[LedgerCols.DATE, LedgerCols.DESCRIPTION, LedgerCols.CATEGORY, LedgerCols.AMOUNT]
+    )
+    ledger[LedgerCols.CURRENCY] = "€"
+    return ledger
+
+
+COFFEE: list[tuple[str, str, str, float]] = [
+    ("2023/01/10", "Nuovo Bar | caffe", "Spese:Cibo:Bar", 1.2),
+    ("2023/01/10", "Nuovo Bar | caffe", "Assets:Intesa XME", -1.2),
+]
+
+
+def test_identical_transaction_added_on_the_mark_date_is_new() -> None:
+    _, mark = ledger_delta(make_ledger(COFFEE * 2), {"date": "", "fingerprints": {}})
+
+    new_postings, updated_mark = ledger_delta(make_ledger(COFFEE * 3), mark)
+
+    assert new_postings[LedgerCols.AMOUNT].tolist() == [1.2, -1.2]
+    assert list(updated_mark["fingerprints"].values()) == [3]
+
+
+def test_synced_transactions_are_not_new_again() -> None:
+    _, mark = ledger_delta(make_ledger(COFFEE * 2), {"date": "", "fingerprints": {}})
+
+    new_postings, updated_mark = ledger_delta(make_ledger(COFFEE * 2), mark)
+
+    assert new_postings.empty
+    assert updated_mark == mark
+
+
+def test_ledger_without_postings_after_the_mark_has_no_delta() -> None:
+    mark: dict = {"date": "2030-01-01", "fingerprints": {"rent": 1}}
+
+    new_postings, updated_mark = ledger_delta(make_ledger(COFFEE), mark)
+
+    assert new_postings.empty
+    assert updated_mark == mark
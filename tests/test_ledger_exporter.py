@@ -0,0 +1,25 @@
+from mmex.ledger_exporter import invert_mapped_categories
+
+
+def test_inversion_prefers_the_ledger_category_with_the_same_leaf() -> None:
+    inverted: dict[str, str] = invert_mapped_categories(
+        {
+            "Spese:Cibo:Pizza": "Cibo:Mangiare fuori:Pranzo",
+            "Spese:Cibo:Pranzo": "Cibo:Mangiare fuori:Pranzo",
+            "Spese:Cibo:Fuori:Panini": "Cibo:Mangiare fuori:Pranzo",
+        }
+    )
+
+    assert inverted == {"Cibo:Mangiare fuori:Pranzo": "Spese:Cibo:Pranzo"}
+
+
+def test_inversion_falls_back_to_the_deepest_then_alphabetical_category() -> None:
+    inverted: dict[str, str] = invert_mapped_categories(
+        {
+            "Spese:Varie": "Altre Uscite",
+            "Spese:Casa:Bollette": "Altre Uscite",
+            "Spese:Casa:Arredo": "Altre Uscite",
+        }
+    )
+
+    assert inverted == {"Altre Uscite": "Spese:Casa:Arredo"}
@@ -0,0 +1,34 @@
+import pathlib
+
+import pytest
+
+from pipeline.pipeline import Pipeline, PipelineError, Stage, StageCache
+
+
+def load() -> str:
+    return "model"
+
+
+def use(model: str) -> str:
+    return model.upper()
+
+
+def test_consuming_a_cacheable_stage_is_rejected(tmp_path: pathlib.Path) -> None:
+    stages: list[Stage] = [
+        Stage(name="model", function=load),
+        Stage(name="map", function=use, dependencies=["model"], consumes=["model"]),
+    ]
+
+    with pytest.raises(PipelineError, match="cacheable"):
+        Pipeline(stages, StageCache(tmp_path / "cache.json"))
+
+
+def test_non_cacheable_consumed_stage_runs_on_every_run(tmp_path: pathlib.Path) -> None:
+    cache: StageCache = StageCache(tmp_path / "cache.json")
+    stages: list[Stage] = [
+        Stage(name="model", function=load, cacheable=False),
+        Stage(name="map", function=use, dependencies=["model"], consumes=["model"]),
+    ]
+
+    assert Pipeline(stages, cache).run()["map"] == "MODEL"
+    assert Pipeline(stages, cache).run()["model"] == "model"
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from reconciliation.reconciliation import reconcile_flows
+
+
+def make_flows(rows: list[tuple[str, str, float]], side: str) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["ACCOUNT", "DATE", side])
+
+
+def test_idle_mmex_account_is_reported_and_checkpointed() -> None:
+    report, checkpoints = reconcile_flows(
+        make_flows([("Intesa", "2023-01-06", -30.0)], "LEDGER"),
+        make_flows([("Intesa", "2023-01-06", -30.0)], "MMEX"),
+        {"Intesa": 0.0, "Revolut": 500.0, "Casa": 0.0},
+        {},
+    )
+
+    assert report.set_index("ACCOUNT").DIFFERENCE.to_dict() == {"Casa": 0.0, "Intesa": 0.0, "Revolut": -500.0}
+    assert report.set_index("ACCOUNT").FIRST_DIVERGING_DATE.dropna().to_dict() == {"Revolut": "2023-01-06"}
+    assert {account: point["date"] for account, point in checkpoints.items()} == {
+        "Casa": "2023-01-06",
+        "Intesa": "2023-01-06",
+    }
+
+
+def test_account_without_new_flows_keeps_its_checkpoint_in_the_report() -> None:
+    checkpoints: dict[str, dict[str, str | float]] = {
+        "Casa": {"date": "2023-01-01", "ledger": 50.0, "mmex": 50.0},
+        "Intesa": {"date": "2023-01-01", "ledger": 100.0, "mmex": 100.0},
+    }
+
+    report, updated_checkpoints = reconcile_flows(
+        make_flows([("Intesa", "2023-01-06", -30.0)], "LEDGER"),
+        make_flows([("Intesa", "2023-01-06", -30.0)], "MMEX"),
+        {"Intesa": 0.0, "Casa": 0.0},
+        checkpoints,
+    )
+
+    assert report[["ACCOUNT", "LEDGER_BALANCE", "MMEX_BALANCE"]].to_numpy().tolist() == [
+        ["Casa", 50.0, 50.0],
+        ["Intesa", 70.0, 70.0],
+    ]
+    assert updated_checkpoints["Casa"]["date"] == "2023-01-06"
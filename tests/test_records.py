@@ -0,0 +1,30 @@
+import csv
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from mmex.records import CONVERTED_COLUMNS, ConvertedTransaction, iter_converted_transactions, tee_to_csv
+
+
+def test_missing_values_are_converted_to_none() -> None:
+    values: list = [1, "2023-01-06", "R", "Withdrawal", "Conto", np.nan, "Esselunga", 12.5, "EUR"]
+    values += [np.nan, None, "Spesa", "", ""]
+    transactions: pd.DataFrame = pd.DataFrame([values], columns=CONVERTED_COLUMNS)
+
+    (transaction,) = iter_converted_transactions(transactions)
+
+    assert transaction.to_account is None
+    assert transaction.to_amount is None
+    assert transaction.to_currency is None
+    assert transaction.amount == 12.5
+    assert type(transaction.amount) is float
+
+
+def test_the_header_is_written_without_records(tmp_path: pathlib.Path) -> None:
+    path: pathlib.Path = tmp_path / "test_db.csv"
+
+    assert list(tee_to_csv([], path, ConvertedTransaction._fields)) == []
+
+    with path.open(newline="") as file:
+        assert list(csv.reader(file)) == [list(ConvertedTransaction._fields)]
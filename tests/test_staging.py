@@ -0,0 +1,94 @@
+import pathlib
+import sqlite3
+
+import pytest
+
+from mmex.staging import StagingValidationError, staging_database
+
+SCHEMA: str = """
+CREATE TABLE ACCOUNTLIST_V1 (ACCOUNTID INTEGER PRIMARY KEY, ACCOUNTNAME TEXT, INITIALBAL NUMERIC);
+CREATE TABLE CATEGORY_V1 (CATEGID INTEGER PRIMARY KEY, CATEGNAME TEXT, PARENTID INTEGER);
+CREATE TABLE PAYEE_V1 (PAYEEID INTEGER PRIMARY KEY, PAYEENAME TEXT);
+CREATE TABLE CHECKINGACCOUNT_V1 (
+    TRANSID INTEGER PRIMARY KEY, ACCOUNTID INTEGER, TOACCOUNTID INTEGER, PAYEEID INTEGER, TRANSCODE TEXT,
+    TRANSAMOUNT NUMERIC, CATEGID INTEGER
+);
+CREATE TABLE SPLITTRANSACTIONS_V1 (SPLITTRANSID INTEGER PRIMARY KEY, TRANSID INTEGER, CATEGID INTEGER,
+    SPLITTRANSAMOUNT NUMERIC);
+INSERT INTO PAYEE_V1 VALUES (1, 'Esselunga');
+"""
+
+
+def make_database(path: pathlib.Path, journal_mode: str) -> None:
+    connection: sqlite3.Connection = sqlite3.connect(path)
+    connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+    connection.executescript(SCHEMA)
+    connection.close()
+
+
+def payee_names(path: pathlib.Path) -> list[str]:
+    with sqlite3.connect(path) as connection:
+        names: list[str] = [row[0] for row in connection.execute("SELECT PAYEENAME FROM PAYEE_V1 ORDER BY PAYEEID")]
+    connection.close()
+    return names
+
+
+@pytest.mark.parametrize("journal_mode", ["DELETE", "WAL"])
+def test_staged_changes_are_written_back(tmp_path: pathlib.Path, journal_mode: str) -> None:
+    path: pathlib.Path = tmp_path / "finances.mmb"
+    make_database(path, journal_mode)
+
+    with staging_database(path) as connection:
+        connection.execute("INSERT INTO PAYEE_V1 VALUES (2, 'Nuovo Bar')")
+
+    assert payee_names(path) == ["Esselunga", "Nuovo Bar"]
+
+
+def test_write_back_is_refused_while_another_connection_has_uncheckpointed_writes(tmp_path: pathlib.Path) -> None:
+    path: pathlib.Path = tmp_path / "finances.mmb"
+    make_database(path, "WAL")
+    # The application keeps the database open, its committed write stays in the -wal file until a checkpoint
+    application: sqlite3.Connection = sqlite3.connect(path)
+    application.execute("PRAGMA wal_autocheckpoint = 0")
+    application.execute("INSERT INTO PAYEE_V1 VALUES (2, 'Scritto dalla app')")
+    application.commit()
+
+    with pytest.raises(StagingValidationError, match="in use"):
+        with staging_database(path) as connection:
+            connection.execute("INSERT INTO PAYEE_V1 VALUES (3, 'Nuovo Bar')")
+
+    application.execute("INSERT INTO PAYEE_V1 VALUES (4, 'Scritto dopo')")
+    application.commit()
+    application.close()
+    assert payee_names(path) == ["Esselunga", "Scritto dalla app", "Scritto dopo"]
+
+
+@pytest.mark.parametrize("journal_mode", ["DELETE", "WAL"])
+def test_write_back_is_refused_if_the_file_changed_since_it_was_loaded(
+    tmp_path: pathlib.Path, journal_mode: str
+) -> None:
+    path: pathlib.Path = tmp_path / "finances.mmb"
+    make_database(path, journal_mode)
+
+    with pytest.raises(StagingValidationError, match="changed since it was loaded"):
+        with staging_database(path) as connection:
+            connection.execute("INSERT INTO PAYEE_V1 VALUES (2, 'Nuovo Bar')")
+            application: sqlite3.Connection = sqlite3.connect(path)
+            application.execute("INSERT INTO PAYEE_V1 VALUES (2, 'Scritto dalla app')")
+            application.commit()
+            application.close()
+
+    assert payee_names(path) == ["Esselunga", "Scritto dalla app"]
+
+
+def test_block_without_changes_does_not_rewrite_the_file(tmp_path: pathlib.Path) -> None:
+    path: pathlib.Path = tmp_path / "finances.mmb"
+    make_database(path, "DELETE")
+    modified_before: int = path.stat().st_mtime_ns
+
+    with staging_database(path) as connection:
+        connection.execute("INSERT INTO PAYEE_V1 VALUES (2, 'Nuovo Bar')")
+        connection.rollback()
+
+    assert path.stat().st_mtime_ns == modified_before
+    assert payee_names(path) == ["Esselunga"]
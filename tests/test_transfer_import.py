@@ -0,0 +1,30 @@
+import pathlib
+
+import pandas as pd
+import pytest
+
+from notebooks.transfer_import import allocate_transaction_ids, get_run_timestamp
+
+
+def test_allocation_fills_the_gaps_before_appending() -> None:
+    assert allocate_transaction_ids([2, 3, 5, 9], 6) == [1, 4, 6, 7, 8, 10]
+
+
+def test_allocation_stops_inside_a_gap() -> None:
+    assert allocate_transaction_ids([1, 10], 3) == [2, 3, 4]
+
+
+def test_allocation_on_an_empty_table_starts_from_one() -> None:
+    assert allocate_transaction_ids([], 2) == [1, 2]
+
+
+def test_reproducible_timestamp_is_capped_at_the_latest_update_time(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    path: pathlib.Path = tmp_path / "2023.csv"
+    pd.DataFrame({"Data": ["2023-01-06", "2027-01-01"]}).to_csv(path, index=False)
+
+    assert get_run_timestamp([path], reproducible=True) == "2027-01-01T00:00:00"
+    assert get_run_timestamp([path], True, "2026-10-19T05:17:59") == "2026-10-19T05:17:59"
+    assert get_run_timestamp([path], True, "2028-01-01T10:00:00") == "2027-01-01T00:00:00"